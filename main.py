@@ -4,10 +4,7 @@ from stock_sim.sim_engine import run_2v_sims, run_stat_sim, run_time_sim, run_st
 from stock_sim.finance import tax_rates
 from stock_sim.utils import pick_random_date
 from stock_sim.optimization import find_best_2v
-import pandas as pd
 import os
-import cProfile
-import pstats
 
 def load_config(file_path):
     """ Load configuration from a JSON file """
@@ -25,8 +22,15 @@ def main():
     # Convert the tax bracket identifier from the string in the config to the actual tax rates
     params['taxes'] = tax_rates[params['taxes']]
 
+    # Set params['plot_output'] to a directory to save graphs as PNG (or params['plot_format'] = "svg")
+    # without a GUI instead of showing them
+    # Set params['profile'] = True to profile a run and its workers into profile.prof
+    # (or params['profile_output']) with the top params['profile_top'] functions printed
     # Uncomment any simulation you want to run
     # run_stat_sim(params, 500)
+    # run_stat_sim(params, 100000, batch=True)
+    # run_stat_sim(dict(params, bootstrap=True), 100000, batch=True)
+    # run_stat_sim(params, 2000, batch=True, antithetic=True, tolerance=50000)
     # run_stat_sim_retirement(params, 500)
     # run_time_sim(params)
     # run_2v_sims(params, 
@@ -38,6 +42,8 @@ def main():
     find_best_2v(params, 
                 {'min': 0.01, 'max': 1, 'increment': 0.02, 'name': 'invest_factor'},
                 {'min': 65000, 'max': 150000, 'increment': 5000, 'name': 'income'})
+    # Pass cache=ResultCache() to reuse the cells of earlier runs with the same config
+    # and adaptive=True to search the grid coarse-to-fine instead of simulating every cell
 
 if __name__ == '__main__':
     main()
@@ -4,6 +4,15 @@
 
 from .sim_engine import run_sim
 from .finance import get_monthly_cost
-from .visualization import create_3d_graph
+
+def __getattr__(name: str):
+    '''
+    Imports the plotting functions on first use, keeping matplotlib off the import path of
+    processes that never plot, such as Pool workers
+    '''
+    if name == 'create_3d_graph':
+        from .visualization import create_3d_graph
+        return create_3d_graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Other imports if needed...
@@ -0,0 +1,218 @@
+'''
+Vectorized simulation engine that steps many independent paths of run_sim at once
+'''
+import numpy as np
+
+from .finance import Investments, get_monthly_cost, growth_factors
+from .taxes import configure_tax_cache_for
+from .utils import bootstrap_growth, weekly_growth
+
+def _subtract_value(cash: np.ndarray, stocks: np.ndarray, bonds: np.ndarray,
+                    amount, cash_floor: float = 0) -> None:
+    '''
+    Vectorized Investments.subtract_value, removing cash then stocks then bonds in place
+    '''
+    amount = np.broadcast_to(amount, cash.shape).astype(float)
+    from_cash = amount < cash - cash_floor
+    cash[from_cash] -= amount[from_cash]
+
+    rest = ~from_cash
+    amount = np.where(rest, amount - (cash - cash_floor), 0.0)
+    cash[rest] = cash_floor
+
+    # Stocks absorb what cash could not cover
+    stocks_cleared = rest & (amount >= stocks)
+    stocks_partial = rest & ~stocks_cleared
+    amount = np.where(stocks_cleared, amount - stocks, amount)
+    stocks[stocks_partial] -= amount[stocks_partial]
+    stocks[stocks_cleared] = 0
+    rest = stocks_cleared
+
+    # Then bonds, and any remainder drives cash below the floor
+    bonds_cleared = rest & (amount >= bonds)
+    bonds_partial = rest & ~bonds_cleared
+    amount = np.where(bonds_cleared, amount - bonds, amount)
+    bonds[bonds_partial] -= amount[bonds_partial]
+    bonds[bonds_cleared] = 0
+    overdrawn = bonds_cleared & (amount > 0)
+    cash[overdrawn] -= amount[overdrawn]
+
+def _invest_amount(strategy: str, post_tax: float, cash: np.ndarray, asset_value: np.ndarray,
+                   invest_factor: float, cash_base_factor: float, cash_base_amt: float,
+                   cash_ceiling: float):
+    '''
+    Vectorized Investments.run_investment_strategy amount selection
+    '''
+    match strategy:
+        case "Basic" | "ForrestStrategy":
+            return np.full(cash.shape, invest_factor*post_tax)
+        case "NWFraction":
+            return invest_factor*cash
+        case "SafeNWFraction":
+            return np.where(cash > cash_base_amt, invest_factor*cash+invest_factor*post_tax,
+                            invest_factor*post_tax)
+        case "SafeNWCashFraction" | "SafeNWDividendRatio":
+            return np.where(cash > cash_base_factor*asset_value + cash_base_amt,
+                            invest_factor*cash+invest_factor*post_tax, invest_factor*post_tax)
+        case "CashRatioCeiling":
+            return np.where(cash > cash_ceiling,
+                            invest_factor * post_tax + invest_factor * cash + (cash - cash_ceiling),
+                            np.where(cash > cash_base_factor * asset_value + cash_base_amt,
+                                     invest_factor * cash + invest_factor * post_tax,
+                                     invest_factor * post_tax))
+        case _:
+            return np.zeros(cash.shape)
+
+def _growth_matrix(params: dict, n_paths: int, rng: np.random.Generator) -> np.ndarray:
+    '''
+    Weekly growth factors for every path, shaped (years*52, n_paths) so each week is contiguous
+    '''
+    weeks = params['years']*52
+    if params['backtest']:
+        start = None if params['start_date'] == "random" else params['start_date']
+        return weekly_growth(params['backtest_ticker'], params['years'], start, n_paths, rng)
+    if params.get('bootstrap'):
+        return bootstrap_growth(params.get('bootstrap_tickers') or [params['backtest_ticker']], weeks,
+                                params['bootstrap_block_weeks'], rng, n_paths)
+    std_dev = 0 if params['use_avg_growth'] else params['std_dev']
+    if params.get('antithetic'):
+        # Every drawn path is followed by its antithetic twin, drawn again from the same generator state
+        pairs = -(-n_paths // 2)
+        state = rng.bit_generator.state
+        drawn = growth_factors(params['avg_growth'], std_dev, weeks, rng, pairs)
+        rng.bit_generator.state = state
+        mirrored = growth_factors(params['avg_growth'], std_dev, weeks, rng, pairs, antithetic=True)
+        return np.stack([drawn, mirrored], axis=2).reshape(weeks, 2 * pairs)[:, :n_paths]
+    return growth_factors(params['avg_growth'], std_dev, weeks, rng, n_paths)
+
+def _run_chunk(params: dict, growth: np.ndarray) -> dict:
+    '''
+    Steps every path of a growth matrix through the weekly loop of run_sim together
+    '''
+    n_paths = growth.shape[1]
+    expenses = sum(params['expenses'].values()) if isinstance(params['expenses'], dict) else params['expenses']
+    annual_tax = params['annualized_taxes']
+    house_loan = params['house_loan']
+    down_pay_amt = params['house_cost']*params['down_pay_fraction']
+    month_mortgage = get_monthly_cost(params['house_cost'],
+                                      params['mortgage_interest_rate'],
+                                      params['loan_length'], down_pay_amt)
+    house_start_year = params['year_loan_start']
+    cash_floor = params['cash_floor']
+    cash_ceiling = params['cash_ceiling']
+    retirement_income_goal = params['retirement_income_goal']
+    retirement_usage = params['retirement_usage']
+    pre_tax_dividend = params['pre_tax_dividend']
+    check_negative = params['check_negative']
+    strategy = params['strategy']
+    invest_factor = params['invest_factor']
+    cash_base_factor = params['cash_base_factor']
+    cash_base_amt = params['cash_base_amt']
+    dividend_growth = params['dividend_growth']
+    weekly_expenses = expenses*12/52
+
+    # Scalar portfolio used only as the tax calculator, income is identical across paths
+    invest = Investments(0, params['income'], params['avg_growth'], dividend_growth, expenses, params['taxes'])
+
+    cash = np.zeros(n_paths)
+    stocks = np.full(n_paths, float(params['start_cash']))
+    bonds = np.zeros(n_paths)
+    min_cash_val = np.full(n_paths, float(params['start_cash']))
+    min_cash_year = np.full(n_paths, -1)
+    cash_negative = np.zeros(n_paths, dtype=bool)
+    value_negative = np.zeros(n_paths, dtype=bool)
+    retirement_year = np.full(n_paths, -1)
+    div_tax = np.zeros(n_paths)
+
+    for year in range(params['years']):
+        if year == params['cash_injection_year']:
+            if params['cash_injection_amt'] < 0:
+                _subtract_value(cash, stocks, bonds, -1*params['cash_injection_amt'], cash_floor)
+            else:
+                cash += params['cash_injection_amt']
+        if params['promotion']['enabled'] and year in params['promotion']['years']:
+            promotion_year_index = params['promotion']['years'].index(year)
+            invest.set_income(params['promotion']['salaries'][promotion_year_index])
+
+        house_loan_month = month_mortgage if year > house_start_year and house_loan else 0
+        if year == house_start_year and house_loan:
+            _subtract_value(cash, stocks, bonds, down_pay_amt, cash_floor)
+
+        house_loan_month = 0 if year > house_start_year + params['loan_length'] else house_loan_month
+
+        house_payment_week = house_loan_month*12/52
+        weekly_income = invest.get_weekly_income()
+        annual_dividends = np.zeros(n_paths)
+        # Taxes are taken at the shared tax cache's rounded amounts, like the scalar engine
+        quantize = invest.tax_cache.quantize
+        income_tax = invest.calculate_taxes_owed_cached(invest.income)[1]
+        dividend_rate = invest.tax_schedule.dividend_rate(quantize(invest.income))
+        # Stop checking for retirement once every path has reached it
+        searching = bool(np.any(retirement_year == -1))
+        retirement_stocks = invest.retirement_threshold(retirement_usage, retirement_income_goal)
+
+        for week in range(1, 53):
+            post_tax = 0
+            if year > 0:
+                lower = cash < min_cash_val
+                min_cash_val = np.where(lower, cash, min_cash_val)
+                min_cash_year = np.where(lower, year, min_cash_year)
+            if week%2 == 0:
+                net_week = weekly_income - weekly_expenses - house_payment_week
+                post_tax = (2*net_week if annual_tax
+                            else (2*net_week-2*income_tax/52))
+                if post_tax < 0:
+                    _subtract_value(cash, stocks, bonds, -1*post_tax, cash_floor)
+                else:
+                    cash += post_tax
+            invest_amount = _invest_amount(strategy, post_tax, cash, cash + stocks + bonds,
+                                           invest_factor, cash_base_factor, cash_base_amt, cash_ceiling)
+            stocks *= growth[year*52 + week - 1]
+            invest_amount = np.where(cash >= invest_amount, invest_amount, 0.0)
+            stocks += invest_amount
+            cash -= invest_amount
+            if week%13 == 0:
+                dividend = stocks*dividend_growth/4
+                if pre_tax_dividend:
+                    stocks += dividend-dividend_rate*quantize(dividend / 4)
+                else:
+                    stocks += dividend
+                annual_dividends += dividend
+            if check_negative:
+                cash_negative |= cash < 0
+                value_negative |= cash + stocks + bonds < 0
+            if searching:
+                retirement_year[(stocks >= retirement_stocks) & (retirement_year == -1)] = year
+        # Subtract taxes once per year
+        if annual_tax:
+            div_tax = invest.calculate_taxes_owed(quantize(invest.income), quantize(annual_dividends))[1]
+            _subtract_value(cash, stocks, bonds, div_tax)
+        elif not pre_tax_dividend:
+            div_tax = dividend_rate*quantize(annual_dividends)
+            _subtract_value(cash, stocks, bonds, div_tax)
+        invest.income *= params['raise_factor']
+
+    min_cash_val = np.where(min_cash_year == -1, cash_ceiling, min_cash_val)
+    return {
+        "net_assets": cash + stocks,
+        "cash": cash,
+        "div_tax": div_tax,
+        "was_negative": np.column_stack([cash_negative | value_negative, value_negative]),
+        "min_cash": min_cash_val,
+        "retirement_year": retirement_year
+    }
+
+def run_batch_sim(params: dict, n_paths: int, chunk_size: int = 4096, seed=None) -> dict:
+    '''
+    Runs n_paths simulations of the same parameters in one process, with every path's state
+    held in arrays shaped (n_paths,). Returns arrays matching the fields of multiprocess_sim.
+    '''
+    configure_tax_cache_for(params)
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for start in range(0, n_paths, chunk_size):
+        growth = _growth_matrix(params, min(chunk_size, n_paths - start), rng)
+        chunks.append(_run_chunk(params, growth))
+    if not chunks:
+        chunks.append(_run_chunk(params, np.empty((params['years']*52, 0))))
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
@@ -0,0 +1,161 @@
+'''
+Micro and macro benchmarks of the simulation engine with a stored baseline. Record a baseline on
+a quiet machine, then compare later runs against it to catch performance regressions:
+
+    python -m stock_sim.benchmarks --save
+    python -m stock_sim.benchmarks --compare --threshold 0.25
+
+Compare exits with status 1 when any benchmark is slower than the baseline by more than the threshold
+'''
+from contextlib import redirect_stdout
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from .finance import Investments, tax_rates
+from .price_cache import ticker_path
+from .sim_engine import run_2v_sims, run_sim, run_stat_sim
+from .utils import pull_random_range
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'database', 'configs', 'test_config.json')
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'database', 'benchmarks.json')
+BENCHMARKS = {} # (setup, calls per repeat) of every benchmark by name
+
+def benchmark(name: str, number: int = 1):
+    '''
+    Registers a benchmark, a function that takes the base parameters, does any setup and returns
+    the call to time over number calls per repeat
+    '''
+    def register(setup):
+        BENCHMARKS[name] = (setup, number)
+        return setup
+    return register
+
+def load_params() -> dict:
+    '''
+    The test config with its tax table resolved, 40 years long
+    '''
+    with open(CONFIG_PATH, 'r') as file:
+        params = json.load(file)
+    params['taxes'] = tax_rates[params['taxes']]
+    params['years'] = 40
+    return params
+
+@benchmark("run_sim_deterministic", number=20)
+def bench_run_sim_deterministic(params: dict):
+    return lambda: run_sim(**dict(params, use_avg_growth=True, record='none'))
+
+@benchmark("run_sim_stochastic", number=20)
+def bench_run_sim_stochastic(params: dict):
+    return lambda: run_sim(**dict(params, use_avg_growth=False, seed=1, record='none'))
+
+@benchmark("run_sim_backtest", number=20)
+def bench_run_sim_backtest(params: dict):
+    return lambda: run_sim(**dict(params, backtest=True, start_date="1960-01-04", record='none'))
+
+@benchmark("calculate_taxes_owed", number=2000)
+def bench_calculate_taxes_owed(params: dict):
+    invest = Investments(0, params['income'], 1, 0, {}, params['taxes'])
+    return lambda: invest.calculate_taxes_owed(params['income'], 4000)
+
+@benchmark("pull_random_range", number=200)
+def bench_pull_random_range(params: dict):
+    return lambda: pull_random_range(ticker_path("^GSPC"), 10)
+
+@benchmark("run_2v_sims")
+def bench_run_2v_sims(params: dict):
+    def run():
+        with tempfile.TemporaryDirectory() as plots:
+            run_2v_sims(dict(params, plot_output=plots),
+                        {'min': 0.1, 'max': 0.9, 'increment': 0.2, 'name': 'invest_factor'},
+                        {'min': 100000, 'max': 200000, 'increment': 25000, 'name': 'income'})
+    return run
+
+@benchmark("run_stat_sim")
+def bench_run_stat_sim(params: dict):
+    def run():
+        with tempfile.TemporaryDirectory() as plots:
+            run_stat_sim(dict(params, seed=1, plot_output=plots), 200)
+    return run
+
+def time_benchmark(call, number: int, repeat: int) -> float:
+    '''
+    Fastest time of a single call over repeat rounds of number calls, after one warm-up call that
+    fills the price and tax caches. The minimum is the run least disturbed by the rest of the machine
+    '''
+    call()
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            call()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+def run_benchmarks(names: list = None, repeat: int = 5) -> dict:
+    '''
+    Seconds per call of the named benchmarks, every benchmark by default. Simulation output is
+    silenced and graphs are rendered to a temporary directory
+    '''
+    params = load_params()
+    results = {}
+    for name in names or BENCHMARKS:
+        setup, number = BENCHMARKS[name]
+        with redirect_stdout(io.StringIO()):
+            results[name] = time_benchmark(setup(params), number, repeat)
+        print(f"{name:<24}{results[name] * 1e3:12.3f} ms")
+    return results
+
+def save_baseline(results: dict, path: str = BASELINE_PATH) -> None:
+    '''
+    Stores benchmark results as the baseline along with the machine they were measured on
+    '''
+    with open(path, 'w') as file:
+        json.dump({"machine": platform.platform(), "python": platform.python_version(),
+                   "results": results}, file, indent=4)
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[tuple]:
+    '''
+    Benchmarks slower than their baseline by more than threshold (0.25 for 25%),
+    as (name, baseline seconds, current seconds) tuples
+    '''
+    return [(name, baseline[name], seconds) for name, seconds in results.items()
+            if name in baseline and seconds > baseline[name] * (1 + threshold)]
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the simulation engine")
+    parser.add_argument('--save', action='store_true', help="store the results as the baseline")
+    parser.add_argument('--compare', action='store_true', help="fail if slower than the baseline")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown, 0.25 for 25%%")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument('--repeat', type=int, default=5, help="timing rounds per benchmark")
+    parser.add_argument('names', nargs='*', help=f"benchmarks to run, all by default: {', '.join(BENCHMARKS)}")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    results = run_benchmarks(args.names, args.repeat)
+    if args.compare:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)['results']
+        for name, seconds in results.items():
+            if name in baseline:
+                print(f"{name:<24}{(seconds / baseline[name] - 1) * 100:+8.1f}% vs baseline")
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after in regressions:
+            print(f"Regression: {name} took {after * 1e3:,.3f} ms against {before * 1e3:,.3f} ms")
+        if regressions:
+            return 1
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"Saved the baseline to {args.baseline}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
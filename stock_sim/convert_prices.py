@@ -0,0 +1,20 @@
+'''
+Converts the price CSVs of the database, or of a directory given on the command line, to the
+binary store price_cache memory-maps:
+
+    python -m stock_sim.convert_prices [directory]
+
+Kept apart from price_cache, which the package imports, so running it as a script does not
+load it a second time
+'''
+import sys
+
+from .price_cache import convert_database
+
+def main(argv: list = None) -> int:
+    for converted in convert_database(*(sys.argv[1:] if argv is None else argv)):
+        print(f'Converted {converted}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,9 @@
+from collections.abc import MutableMapping
 import numpy as np
 from datetime import timedelta
-import pandas as pd
 import random
-from .utils import pull_random_range
+from .taxes import compile_tax_rates, tax_cache
+from .utils import bootstrap_growth, weekly_growth
 
 tax_rates = {
     "virginia_us_tax_rates_single": {
@@ -176,87 +177,139 @@ tax_rates = {
     }
 }
 
+class AssetsView(MutableMapping):
+    '''
+    Mapping of asset names to an Investments' cash, stocks and bonds attributes,
+    kept so dictionary-style access to the assets keeps working
+    '''
+    __slots__ = ('portfolio',)
+    names = ('cash', 'stocks', 'bonds')
+
+    def __init__(self, portfolio: "Investments"):
+        self.portfolio = portfolio
+
+    def __getitem__(self, name: str) -> float:
+        if name not in self.names:
+            raise KeyError(name)
+        return getattr(self.portfolio, name)
+
+    def __setitem__(self, name: str, value: float) -> None:
+        if name not in self.names:
+            raise KeyError(name)
+        setattr(self.portfolio, name, value)
+
+    def __delitem__(self, name: str) -> None:
+        raise TypeError("Assets cannot be removed from a portfolio")
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
 class Investments:
     '''
     Financial Portfolio including all asset types and functions to handle how they change
     '''
+    __slots__ = ('income', 'market_growth', 'dividend_growth', 'expenses', 'tax_rates', 'tax_schedule',
+                 'cash', 'stocks', 'bonds', 'std_dev', 'contributions', 'backtest', 'years', 'year',
+                 'week', 'tick', 'starting_date', 'tax_cache', 'rng', 'growth_buffer', 'growth_key',
+                 'growth_idx', 'bootstrap_block', 'antithetic')
+
     def __init__(self, value: float, income: float, market_growth: float, dividend_growth: float, expenses: dict,
-                tax_rates: dict, assets: dict=None, std_dev: float=0, backtest: bool=False, years: int=0, fixed_start_date = None, tick="^GSPC"):
+                tax_rates: dict, assets: dict=None, std_dev: float=0, backtest: bool=False, years: int=0, fixed_start_date = None, tick="^GSPC",
+                seed=None, bootstrap_block: int=0, bootstrap_ticks: list=None, antithetic: bool=False):
         if assets is None:
             assets = {'cash': 0, 'stocks': 0, 'bonds': 0}
+        self.cash = assets['cash'] # Asset valuations, also exposed as the assets mapping
+        self.stocks = assets['stocks']
+        self.bonds = assets['bonds']
         self.income = income # Annual income
         self.market_growth = market_growth # Current market growth average
         self.dividend_growth = dividend_growth # Dividend yields
         self.expenses = expenses # Monthly Expenses
         self.tax_rates = tax_rates # Tax bracket values chosen
-        self.assets = assets # Dictionary of all asset valuations
-        self.assets['stocks'] += value
+        self.tax_schedule = compile_tax_rates(tax_rates) # Brackets compiled for binary search lookups
+        self.stocks += value
         self.std_dev = std_dev # Average volatility
         self.contributions = 0
         self.backtest = backtest # Backtest
-        self.backtest_idx = 0
-        self.backtest_data = []
         self.years = years
         self.year = 0
         self.week = 0
         self.tick = tick
         self.starting_date = fixed_start_date
-        self.tax_cache = {}
+        self.tax_cache = tax_cache # Bounded LRU cache shared by every portfolio in the process
+        self.rng = np.random.default_rng(seed) # Source of the pre-drawn growth shocks
+        self.growth_buffer = [] # Weekly growth factors for every simulated week
+        self.growth_key = None # (rate, std_dev) the growth buffer was drawn with
+        self.growth_idx = 0
+        self.bootstrap_block = bootstrap_block # Weeks per resampled block, 0 disables bootstrapping
+        self.antithetic = antithetic # Mirrors the drawn growth shocks, pairing the path with the unmirrored one
         if self.backtest:
-            self.backtest_data = pull_random_range(f'./stock_sim/database/{self.tick}.csv', years, fixed_start_date)
+            self.growth_buffer = weekly_growth(self.tick, years, fixed_start_date, rng=self.rng).tolist()
+        elif self.bootstrap_block:
+            self.growth_buffer = bootstrap_growth(bootstrap_ticks or [self.tick], years*52,
+                                                  bootstrap_block, self.rng).tolist()
+        else:
+            self.draw_growth_buffer(market_growth, std_dev)
 
-    def calculate_tax_bracket(self, income: float) -> dict:
+    @property
+    def assets(self) -> "AssetsView":
         '''
-        Calculates the tax bracket based on income
-        and the tax brackets chosen for the portfolio
+        Dictionary-style view of the cash, stocks and bonds attributes
         '''
-        tax_bracket: dict = {}
-        for tax_type, brackets in self.tax_rates.items():
-            applicable_rate = None
-            highest_threshold = -1
+        return AssetsView(self)
 
-            for rate, (threshold, _) in brackets.items():
-                if highest_threshold < threshold < income:
-                    applicable_rate = rate
-                    highest_threshold = threshold
+    @assets.setter
+    def assets(self, assets: dict) -> None:
+        self.cash = assets['cash']
+        self.stocks = assets['stocks']
+        self.bonds = assets['bonds']
 
-            if applicable_rate is not None:
-                tax_bracket[tax_type] = applicable_rate
+    def draw_growth_buffer(self, rate: float, std_dev: float) -> None:
+        '''
+        Draws the weekly growth factor of every simulated week up front so
+        compounding only has to index into the buffer
+        '''
+        self.growth_key = (rate, std_dev)
+        self.growth_buffer = growth_factors(rate, std_dev, self.years*52, self.rng,
+                                            antithetic=self.antithetic).tolist()
 
-        return tax_bracket
+    def growth_path(self) -> list:
+        '''
+        Growth factor of every simulated week at the portfolio's market growth and volatility,
+        for loops that step through the weeks themselves instead of calling compound_stocks
+        '''
+        if not (self.backtest or self.bootstrap_block) and (self.market_growth, self.std_dev) != self.growth_key:
+            self.draw_growth_buffer(self.market_growth, self.std_dev)
+        return self.growth_buffer
+
+    def calculate_tax_bracket(self, income: float) -> dict:
+        '''
+        Calculates the tax bracket based on income
+        and the tax brackets chosen for the portfolio
+        '''
+        return self.tax_schedule.calculate_tax_bracket(income)
 
     def calculate_taxes_owed_cached(self, income: float, dividends: float=0)-> tuple[dict, float, dict]:
-        cache_key = (income, dividends)
-        if cache_key not in self.tax_cache:
-            self.tax_cache[cache_key] = self.calculate_taxes_owed(income, dividends)
-        return self.tax_cache[cache_key]
+        '''
+        calculate_taxes_owed through the process-wide tax cache, at the cache's rounded amounts
+        '''
+        return self.tax_cache.lookup(self.tax_schedule, income, dividends, self.calculate_taxes_owed)
 
-    def calculate_taxes_owed(self, income: float, dividends: float=0) -> tuple[dict, float, dict]:
+    def calculate_taxes_owed(self, income, dividends=0) -> tuple[dict, float, dict]:
         '''
         Returns raw taxes owed from income, total owned including dividend growth,
-        and realized tax %
+        and realized tax %. Incomes and dividends may be scalars or NumPy arrays
         '''
-        if income <= 0:
+        if (np.any(income <= 0) if isinstance(income, np.ndarray) else income <= 0):
             raise ValueError("Income must be greater than 0")
 
-        tax_brackets: dict = self.calculate_tax_bracket(income)
-        taxes_owed: dict = {}
-        total_owed: float = 0.0
-
-        for tax_type, rate_key in tax_brackets.items():
-            threshold, base_tax = self.tax_rates[tax_type][rate_key]
-            percentage = float(rate_key[:-1]) / 100
-
-            if "dividend" in tax_type:
-                tax_amount = percentage * dividends
-            else:
-                tax_amount = base_tax + percentage * (income - threshold)
-            
-            if "social-security" in tax_type and percentage == 0 and income >= 147_000:
-                tax_amount = 147_000*0.062
-
-            taxes_owed[tax_type] = tax_amount
-            total_owed += tax_amount
+        taxes_owed, total_owed = self.tax_schedule.taxes_owed(income, dividends)
 
         real_tax_percentages: dict = {tax: 100 * amount / income for tax, amount in taxes_owed.items()}
         real_tax_percentages["total"] = 100 * total_owed / income
@@ -276,7 +329,7 @@ class Investments:
         if amt < 0:
             self.subtract_value(-1*amt, floor)
         else:
-            self.assets['cash'] += amt
+            self.cash += amt
 
     def get_weekly_income(self) -> float:
         """Calculates weekly income for paycheck approximation"""
@@ -288,25 +341,25 @@ class Investments:
 
     def get_asset_value(self) -> float:
         """Returns the total valuation of all assets"""
-        return sum(self.assets.values())
+        return self.cash + self.stocks + self.bonds
 
     def get_all_values(self) -> list[float, float, float]:
         """Returns cash, stock, and bond values"""
-        return [self.assets['cash'], self.assets['stocks'], self.assets['bonds']]
+        return [self.cash, self.stocks, self.bonds]
 
     def assets_to_string(self) -> str:
         """Formats assets into a string"""
-        asset_string = ("Cash: " + str(self.assets['cash']) + "\n" +
-                        "Stocks: " + str(self.assets['stocks']) + "\n" +
-                        "Bonds: " + str(self.assets['bonds']) + "\n" +
+        asset_string = ("Cash: " + str(self.cash) + "\n" +
+                        "Stocks: " + str(self.stocks) + "\n" +
+                        "Bonds: " + str(self.bonds) + "\n" +
                         "Total: " + str(self.get_asset_value()))
         return asset_string
 
     def invest_in_etf(self, amount: float) -> None:
         """Converts cash into stock holdings, assumed to be etf for long term growth"""
-        if self.assets['cash'] >= amount:
-            self.assets['stocks'] += amount
-            self.assets['cash'] -= amount
+        if self.cash >= amount:
+            self.stocks += amount
+            self.cash -= amount
             self.contributions += amount
         else:
             # print("out of cash")
@@ -316,138 +369,172 @@ class Investments:
         '''
         Removes cash and assets in preferred order based on a value
         '''
-        if amount < self.assets['cash'] - cash_floor:
-            self.assets['cash'] -= amount
+        if amount < self.cash - cash_floor:
+            self.cash -= amount
             amount = 0
             return
-        amount -= (self.assets['cash']-cash_floor)
-        self.assets['cash'] = cash_floor
-        if amount >= self.assets['stocks']:
+        amount -= (self.cash-cash_floor)
+        self.cash = cash_floor
+        if amount >= self.stocks:
 
-            amount -= self.assets['stocks']
-            self.assets['stocks'] = 0
+            amount -= self.stocks
+            self.stocks = 0
         else:
-            self.assets['stocks'] -= amount
+            self.stocks -= amount
             amount = 0
             return
-        if amount >= self.assets['bonds']:
-            amount -= self.assets['bonds']
-            self.assets['bonds'] = 0
+        if amount >= self.bonds:
+            amount -= self.bonds
+            self.bonds = 0
         else:
-            self.assets['bonds'] -= amount
+            self.bonds -= amount
             amount = 0
             return
         if amount > 0:
-            self.assets['cash'] -= amount
+            self.cash -= amount
             amount = 0
         return
 
     def get_dividends(self) -> float:
         """Returns quarterly dividends"""
-        # print(f"Stocks: {self.assets['stocks']:,.2f}, Growth: {self.dividend_growth:,.2f}")
-        return self.assets['stocks']*self.dividend_growth/4
+        # print(f"Stocks: {self.stocks:,.2f}, Growth: {self.dividend_growth:,.2f}")
+        return self.stocks*self.dividend_growth/4
 
     def compound_stocks(self, rate: float, contribution: float, std_dev: float=0, weeks: int=1) -> None:
         """Applies compounding model to stock growth and handles investment event"""
-        if not self.backtest:
-            if std_dev != 0:
-                period_std_deviation = std_dev / (52 / weeks)**0.5
-                period_growth = (rate - 1) * weeks / 52
-                growth = 1 + np.random.normal(period_growth, period_std_deviation)
-            else:
-                growth = 1 + weeks * (rate - 1) / 52
-                
-            self.assets['stocks'] *= growth
+        if self.backtest or self.bootstrap_block:
+            # Calendar-week growth of the backtest window or of resampled historical blocks
+            growth = self.growth_buffer[self.growth_idx]
+            self.growth_idx += 1
+        elif weeks == 1 and self.growth_idx < len(self.growth_buffer):
+            if (rate, std_dev) != self.growth_key:
+                self.draw_growth_buffer(rate, std_dev)
+            growth = self.growth_buffer[self.growth_idx]
+            self.growth_idx += 1
+        elif std_dev != 0:
+            period_std_deviation = std_dev / (52 / weeks)**0.5
+            period_growth = (rate - 1) * weeks / 52
+            growth = 1 + self.rng.normal(period_growth, period_std_deviation)
         else:
-            curr_val = self.backtest_data[self.backtest_idx]
-            self.backtest_idx += 5
-            next_val = self.backtest_data[self.backtest_idx]
-            growth_ratio = next_val/curr_val
-            self.assets['stocks'] *= growth_ratio
-        
+            growth = 1 + weeks * (rate - 1) / 52
+        self.stocks *= growth
+
         self.invest_in_etf(contribution)
 
     def calculate_passive_income(self, percent_use_after_retirement: float) -> float:
         """Calculates the average income from investments"""
-        return (self.assets['stocks']*percent_use_after_retirement
-                - self.calculate_taxes_owed(self.income, (self.assets['stocks']
+        return (self.stocks*percent_use_after_retirement
+                - self.calculate_taxes_owed(self.income, (self.stocks
                 * percent_use_after_retirement))[0]['federal_dividend'])
 
-    def run_investment_strategy(self, post_tax: float, strategy: str="Basic", invest_factor: float=0.25,
-                                cash_base_factor: float = 0.05, cash_base_amt: float = 75000, cash_ceiling: float = 500_000) -> None:
+    def retirement_threshold(self, percent_use_after_retirement: float, income_goal: float) -> float:
         '''
-        This is where strategies can be tested and assigned a name
+        Stock value at which the after-tax passive income at the current income's dividend
+        bracket meets income_goal, so retirement checks within a year are one comparison
+        '''
+        after_tax_use = percent_use_after_retirement * (1 - self.calculate_taxes_owed(self.income, 1)[0]['federal_dividend'])
+        if after_tax_use > 0:
+            return income_goal / after_tax_use
+        return float('inf') if income_goal > 0 else float('-inf')
+
+    def strategy_function(self, strategy: str="Basic", invest_factor: float=0.25, cash_base_factor: float = 0.05,
+                          cash_base_amt: float = 75000, cash_ceiling: float = 500_000):
+        '''
+        Resolves a strategy and its parameters once into a function of a pay period's post-tax
+        income returning the amount to invest, so the weekly loop skips the name dispatch
         '''
-        invest_amount = 0
-        cash = self.assets['cash']
         match strategy:
             case "Basic":
-                '''
-                Simplest strategy of investing a percentage (invest_factor) 
-                of income, regardless of on-hand cash.
-                '''
-                invest_amount = invest_factor*post_tax
+                def invest_amount(post_tax: float) -> float:
+                    '''
+                    Simplest strategy of investing a percentage (invest_factor) 
+                    of income, regardless of on-hand cash.
+                    '''
+                    return invest_factor*post_tax
             case "NWFraction":
-                '''
-                All post-tax income is put into cash, and a fraction
-                of available cash is invested each pay period.
-                '''
-                invest_amount = invest_factor*cash
+                def invest_amount(post_tax: float) -> float:
+                    '''
+                    All post-tax income is put into cash, and a fraction
+                    of available cash is invested each pay period.
+                    '''
+                    return invest_factor*self.cash
             case "SafeNWFraction":
-                '''
-                If the cash on hand is more than a fixed value, invest a percent of
-                the available cash plus post-tax income. Otherwise, the same percent of post-tax income
-                without drawing from cash fund. Extra paycheck money goes to cash and expenses.
-                '''
-                invest_amount = ((invest_factor*cash+invest_factor*post_tax)
-                                if cash > cash_base_amt else invest_factor*post_tax)
-            case "SafeNWCashFraction":
-                ''' 
-                If the cash on hand is more than a percent of net assets, invest a percent of
-                the available cash plus post-tax income. Otherwise, the same percent of post-tax income
-                without drawing from cash fund. Extra paycheck money goes to cash and expenses.
-
-                The cash_base factor acts as a security measure to prevent overinvesting, allowing
-                an emergency fund as well as a means to directly pay taxes or make purchases while
-                maintaining a reasonable ratio of cash to investments.
-
-                invest_factor is the percentage of extra cash and post-tax income to put into an investment.
-
-                cash_base_amt is a fallback safety to have a fixed amount of cash at minimum before investing
-                from savings.
-                '''
-                invest_amount = ((invest_factor*cash+invest_factor*post_tax)
-                                if cash > cash_base_factor*self.get_asset_value() + cash_base_amt
-                                else invest_factor*post_tax)
+                def invest_amount(post_tax: float) -> float:
+                    '''
+                    If the cash on hand is more than a fixed value, invest a percent of
+                    the available cash plus post-tax income. Otherwise, the same percent of post-tax income
+                    without drawing from cash fund. Extra paycheck money goes to cash and expenses.
+                    '''
+                    cash = self.cash
+                    return ((invest_factor*cash+invest_factor*post_tax)
+                            if cash > cash_base_amt else invest_factor*post_tax)
+            case "SafeNWCashFraction" | "SafeNWDividendRatio": #90%
+                def invest_amount(post_tax: float) -> float:
+                    ''' 
+                    If the cash on hand is more than a percent of net assets, invest a percent of
+                    the available cash plus post-tax income. Otherwise, the same percent of post-tax income
+                    without drawing from cash fund. Extra paycheck money goes to cash and expenses.
+
+                    The cash_base factor acts as a security measure to prevent overinvesting, allowing
+                    an emergency fund as well as a means to directly pay taxes or make purchases while
+                    maintaining a reasonable ratio of cash to investments.
+
+                    invest_factor is the percentage of extra cash and post-tax income to put into an investment.
+
+                    cash_base_amt is a fallback safety to have a fixed amount of cash at minimum before investing
+                    from savings.
+                    '''
+                    cash = self.cash
+                    return ((invest_factor*cash+invest_factor*post_tax)
+                            if cash > cash_base_factor*(cash + self.stocks + self.bonds) + cash_base_amt
+                            else invest_factor*post_tax)
             case "CashRatioCeiling":
-                '''
-                Invest extra cash above a factor of the next expected dividend tax amount, otherwise same as safenwcashfraction
-                '''
-                invest_amount = (
-                    invest_factor * post_tax + invest_factor * cash + (cash - cash_ceiling)
-                    if cash > cash_ceiling else
-                    invest_factor * cash + invest_factor * post_tax
-                    if cash > cash_base_factor * self.get_asset_value() + cash_base_amt else
-                    invest_factor * post_tax
-                )
-                pass
-            case "SafeNWDividendRatio": #90%
-                invest_amount = ((invest_factor*cash+invest_factor*post_tax)
-                                if cash > cash_base_factor*self.get_asset_value() + cash_base_amt
-                                else invest_factor*post_tax)
+                def invest_amount(post_tax: float) -> float:
+                    '''
+                    Invest extra cash above a factor of the next expected dividend tax amount, otherwise same as safenwcashfraction
+                    '''
+                    cash = self.cash
+                    return (
+                        invest_factor * post_tax + invest_factor * cash + (cash - cash_ceiling)
+                        if cash > cash_ceiling else
+                        invest_factor * cash + invest_factor * post_tax
+                        if cash > cash_base_factor * (cash + self.stocks + self.bonds) + cash_base_amt else
+                        invest_factor * post_tax
+                    )
             case "ForrestStrategy": #90%
-                invest_amount = invest_factor*post_tax
-            case "NoInvest":
-                '''
-                Put all earnings into cash without any investment
-                '''
-                pass
+                def invest_amount(post_tax: float) -> float:
+                    return invest_factor*post_tax
             case _:
-                pass
-            
+                def invest_amount(post_tax: float) -> float:
+                    '''
+                    Put all earnings into cash without any investment (NoInvest and unknown names)
+                    '''
+                    return 0
+        return invest_amount
+
+    def run_investment_strategy(self, post_tax: float, strategy: str="Basic", invest_factor: float=0.25,
+                                cash_base_factor: float = 0.05, cash_base_amt: float = 75000, cash_ceiling: float = 500_000) -> None:
+        '''
+        This is where strategies can be tested and assigned a name, see strategy_function
+        '''
+        invest_amount = self.strategy_function(strategy, invest_factor, cash_base_factor,
+                                               cash_base_amt, cash_ceiling)(post_tax)
         self.compound_stocks(self.market_growth, invest_amount, self.std_dev)
-        
-            
+
+def growth_factors(rate: float, std_dev: float, weeks: int, rng: np.random.Generator, n_paths: int=None,
+                   antithetic: bool=False) -> np.ndarray:
+    '''
+    Weekly growth factors from the annual growth rate, normally distributed when std_dev is set.
+    Shaped (weeks,) or (weeks, n_paths) for a batch of paths. Antithetic factors mirror the drawn
+    shocks around the mean, the antithetic path of the same generator state
+    '''
+    size = weeks if n_paths is None else (weeks, n_paths)
+    if std_dev != 0:
+        period_std_deviation = std_dev / 52**0.5
+        period_growth = (rate - 1) / 52
+        shocks = rng.normal(period_growth, period_std_deviation, size)
+        return 1 + (2*period_growth - shocks if antithetic else shocks)
+    return np.full(size, 1 + (rate - 1) / 52)
 
 def get_monthly_cost(house_cost: float, interest_rate: float, term_length: float, down_pay_amt: float) -> float:
     """Calculates mortgage payment costs"""
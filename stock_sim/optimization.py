@@ -1,8 +1,11 @@
-from .sim_engine import run_2v_sims, run_stat_sim, run_time_sim
+from .sim_engine import axis_values, root_seeded, run_2v_sims, run_cells, run_stat_sim, run_time_sim, simulation_pool
+from .profiling import profiled
+from .result_cache import ResultCache
 
-def find_best_2v(params: dict, v1: dict, v2: dict, min_cash_threshold=10000):
-    multi_results = run_2v_sims(params, v1, v2)
-    
+def collect_2v_results(multi_results: dict, v1: dict, v2: dict, min_cash_threshold=10000) -> list:
+    '''
+    Feasible cells of a full run_2v_sims grid with their parameter values and ranking fields
+    '''
     # Initialize a list to collect all results
     all_results = []
 
@@ -21,6 +24,9 @@ def find_best_2v(params: dict, v1: dict, v2: dict, min_cash_threshold=10000):
             # Skip results where retirement is not possible (e.g., retirement_year_value is None or -1)
             if retirement_year_value is None or retirement_year_value == -1:
                 continue
+            # Skip runs stopped early for breaking a constraint
+            if multi_results['status'][ridx][vidx] == "pruned":
+                continue
 
             # Collect the result only if min_cash is above the threshold
             if min_cash_value >= min_cash_threshold:
@@ -32,10 +38,101 @@ def find_best_2v(params: dict, v1: dict, v2: dict, min_cash_threshold=10000):
                     'min_cash': min_cash_value
                 })
     
+    return all_results
+
+def is_feasible(result: tuple, min_cash_threshold: float) -> bool:
+    '''
+    Whether a multiprocess_sim result ran without being pruned and retires at all
+    while keeping min_cash above the threshold
+    '''
+    retirement_year = result[5]
+    return (result[6] != "pruned" and retirement_year is not None and retirement_year != -1
+            and result[4] >= min_cash_threshold)
+
+def coarse_stride(count: int, coarse_points: int) -> int:
+    '''
+    Largest power of two step that still leaves coarse_points values along an axis of count values
+    '''
+    stride = 1
+    while (count - 1) // (stride * 2) + 1 >= coarse_points:
+        stride *= 2
+    return stride
+
+def adaptive_search_2v(params: dict, v1: dict, v2: dict, min_cash_threshold=10000, cache: ResultCache = None,
+                       keep: int = 10, coarse_points: int = 5) -> dict:
+    '''
+    Coarse-to-fine search of the v1 x v2 grid. A coarse grid is evaluated first, then the step is
+    halved around the keep best feasible cells (earliest retirement, then highest net assets)
+    until the full resolution is reached and the best cells stop moving.
+    Returns the results of every evaluated cell keyed by its (v1 index, v2 index)
+    '''
+    params['use_avg_growth'] = True
+    # Every round shares one root seed, so random backtests and bootstrapped cells see the same paths
+    params = root_seeded(params)
+    xs = axis_values(v1)
+    ys = axis_values(v2)
+    x_stride = coarse_stride(len(xs), coarse_points)
+    y_stride = coarse_stride(len(ys), coarse_points)
+    # The last value of each axis is always part of the coarse grid
+    coarse_x = sorted(set(range(0, len(xs), x_stride)) | {len(xs) - 1})
+    coarse_y = sorted(set(range(0, len(ys), y_stride)) | {len(ys) - 1})
+    pending = {(x_idx, y_idx) for x_idx in coarse_x for y_idx in coarse_y}
+    evaluated: dict = {}
+    with simulation_pool(params) as pool:
+        while pending:
+            cells = sorted(pending)
+            print(f"Evaluating {len(cells)} cells at steps of {x_stride} x {y_stride}")
+            results = run_cells(params, [{v1['name']: xs[x_idx], v2['name']: ys[y_idx]} for x_idx, y_idx in cells],
+                                cache, pool)
+            evaluated.update(zip(cells, results))
+            feasible = [cell for cell, result in evaluated.items() if is_feasible(result, min_cash_threshold)]
+            # Without any feasible cell yet, every evaluated cell is refined
+            best = sorted(feasible, key=lambda cell: (evaluated[cell][5], -evaluated[cell][0]))[:keep] \
+                if feasible else list(evaluated)
+            # The neighbourhood of a best cell spans the previous step, sampled at the halved step
+            x_radius, y_radius = x_stride, y_stride
+            x_stride, y_stride = max(1, x_stride // 2), max(1, y_stride // 2)
+            pending = {(x_idx, y_idx)
+                       for best_x, best_y in best
+                       for x_idx in range(max(0, best_x - x_radius), min(len(xs), best_x + x_radius + 1), x_stride)
+                       for y_idx in range(max(0, best_y - y_radius), min(len(ys), best_y + y_radius + 1), y_stride)
+                       } - evaluated.keys()
+    return evaluated
+
+@profiled
+def find_best_2v(params: dict, v1: dict, v2: dict, min_cash_threshold=10000, cache: ResultCache = None,
+                 adaptive: bool = False) -> list:
+    '''
+    Prints the 10 best feasible cells of the v1 x v2 grid, searching it coarse-to-fine
+    instead of simulating every cell when adaptive is set. Cells stop simulating as soon as
+    their cash drops below min_cash_threshold since they can no longer qualify
+    '''
+    params = dict(params, stop_min_cash=min_cash_threshold)
+    # Initialize a list to collect all results
+    all_results = []
+
+    if adaptive:
+        evaluated = adaptive_search_2v(params, v1, v2, min_cash_threshold, cache)
+        xs, ys = axis_values(v1), axis_values(v2)
+        full_grid = len(xs) * len(ys)
+        print(f"Evaluated {len(evaluated):,} of {full_grid:,} grid cells "
+              f"({100 * len(evaluated) / max(1, full_grid):.1f}%)")
+        for (ridx, vidx), result in evaluated.items():
+            if is_feasible(result, min_cash_threshold):
+                all_results.append({
+                    v1['name']: xs[ridx],
+                    v2['name']: ys[vidx],
+                    'Retirement Year': result[5],
+                    'Net': result[0],
+                    'min_cash': result[4]
+                })
+    else:
+        all_results = collect_2v_results(run_2v_sims(params, v1, v2, cache), v1, v2, min_cash_threshold)
+
     # If no results meet the criteria, inform the user
     if not all_results:
         print("No results meet the criteria.")
-        return
+        return []
 
     # Sort the results by Retirement Year (ascending), then by Net (descending)
     sorted_results = sorted(
@@ -53,3 +150,4 @@ def find_best_2v(params: dict, v1: dict, v2: dict, min_cash_threshold=10000):
               f"Retirement Year: {result['Retirement Year']}, "
               f"Net: ${result['Net']:,.2f}, "
               f"Min Cash: ${result['min_cash']:,.2f}")
+    return top_10_results
@@ -0,0 +1,197 @@
+'''
+Process-wide cache of ticker price histories as NumPy date/close array pairs,
+shared with Pool workers through shared memory so each CSV is parsed once per run.
+Parsed files are kept in a memory-mappable binary store next to the CSVs,
+refreshed automatically when the CSV changes. Convert the whole database with
+    python -m stock_sim.convert_prices
+'''
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import json
+import os
+import numpy as np
+
+DATABASE_DIR = os.path.join(os.path.dirname(__file__), 'database')
+BINARY_DIR = 'binary' # Subdirectory next to each CSV holding its binary columns
+BINARY_FORMAT = 1
+
+_prices: dict = {} # Absolute file path -> (epoch day dates, closes)
+_weekly: dict = {} # Absolute file path -> (first calendar week, weekly growth factors)
+_attached: list = [] # Shared memory blocks backing attached arrays, kept alive with the process
+
+def ticker_path(tick: str) -> str:
+    '''
+    Location of a ticker's price history in the database
+    '''
+    return os.path.join(DATABASE_DIR, f'{tick}.csv')
+
+def parse_price_csv(file_path: str) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Parses a price CSV into date-sorted int64 epoch days and float64 closes,
+    keeping the exchange's local calendar date and dropping the UTC offset
+    '''
+    import pandas as pd # Only needed to convert CSVs, kept off the import path of every process
+    df = pd.read_csv(file_path, dtype={'Date': str, 'Close': np.float64})
+    dates = df['Date'].str.slice(0, 10).to_numpy().astype('datetime64[D]').astype(np.int64)
+    closes = df['Close'].to_numpy()
+    order = np.argsort(dates, kind='stable')
+    return dates[order], closes[order]
+
+def binary_paths(file_path: str) -> tuple[str, str, str]:
+    '''
+    Locations of the dates column, closes column and source stamp of a price file's binary store
+    '''
+    directory, name = os.path.split(os.path.abspath(file_path))
+    base = os.path.join(directory, BINARY_DIR, os.path.splitext(name)[0])
+    return f'{base}_dates.npy', f'{base}_closes.npy', f'{base}.json'
+
+def _source_stamp(file_path: str) -> dict:
+    '''
+    Identifies the version of a source CSV the binary store was built from
+    '''
+    stat = os.stat(file_path)
+    return {"format": BINARY_FORMAT, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+def convert_price_file(file_path: str) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Parses a price CSV and writes it to the binary store as one .npy file per column
+    '''
+    dates, closes = parse_price_csv(file_path)
+    dates_path, closes_path, stamp_path = binary_paths(file_path)
+    os.makedirs(os.path.dirname(dates_path), exist_ok=True)
+    # Written to temporary names and swapped in so concurrent readers never see partial files
+    for path, column in ((dates_path, dates), (closes_path, closes)):
+        with open(f'{path}.{os.getpid()}.tmp', 'wb') as file:
+            np.save(file, column)
+        os.replace(f'{path}.{os.getpid()}.tmp', path)
+    with open(f'{stamp_path}.{os.getpid()}.tmp', 'w') as file:
+        json.dump(_source_stamp(file_path), file)
+    os.replace(f'{stamp_path}.{os.getpid()}.tmp', stamp_path)
+    return dates, closes
+
+def convert_database(directory: str = DATABASE_DIR) -> list:
+    '''
+    Converts every price CSV in the database to the binary store, returning the converted files
+    '''
+    converted = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.csv'):
+            convert_price_file(os.path.join(directory, name))
+            converted.append(name)
+    return converted
+
+def read_binary(file_path: str) -> tuple[np.ndarray, np.ndarray] | None:
+    '''
+    Memory-maps the binary store of a price file, or None when it is missing or older than the CSV
+    '''
+    dates_path, closes_path, stamp_path = binary_paths(file_path)
+    try:
+        with open(stamp_path, 'r') as file:
+            if json.load(file) != _source_stamp(file_path):
+                return None
+        return np.load(dates_path, mmap_mode='r'), np.load(closes_path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+
+def load_prices(file_path: str) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns the (dates, closes) arrays of a price file, from the binary store when it is current
+    and otherwise by parsing the CSV once and refreshing the store
+    '''
+    key = os.path.abspath(file_path)
+    if key not in _prices:
+        prices = read_binary(key)
+        if prices is None:
+            try:
+                prices = convert_price_file(key)
+            except OSError:
+                # Read-only installs still work, they just parse the CSV every run
+                prices = parse_price_csv(key)
+        _prices[key] = prices
+    return _prices[key]
+
+def get_prices(tick: str) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns the (dates, closes) arrays of a ticker in the database
+    '''
+    return load_prices(ticker_path(tick))
+
+def week_of(days):
+    '''
+    Calendar week number (Monday to Sunday) of epoch days, 1970-01-01 being a Thursday
+    '''
+    return (days + 3) // 7
+
+def weekly_returns(file_path: str) -> tuple[int, np.ndarray]:
+    '''
+    Returns the first calendar week of a price file and the growth factor from the last close of
+    each calendar week to the next, built once per process. Weeks without trading carry the
+    previous close forward so every index is exactly one calendar week apart
+    '''
+    key = os.path.abspath(file_path)
+    if key not in _weekly:
+        dates, closes = load_prices(key)
+        weeks = week_of(dates)
+        # Last trading row of every calendar week that has one
+        last_rows = np.flatnonzero(np.diff(weeks, append=weeks[-1] + 1))
+        first_week = int(weeks[0])
+        week_closes = np.full(int(weeks[-1]) - first_week + 1, np.nan)
+        week_closes[weeks[last_rows] - first_week] = closes[last_rows]
+        # Forward fill the closes of weeks the market was shut
+        filled = np.maximum.accumulate(np.where(np.isnan(week_closes), 0, np.arange(len(week_closes))))
+        week_closes = week_closes[filled]
+        _weekly[key] = (first_week, week_closes[1:] / week_closes[:-1])
+    return _weekly[key]
+
+def clear_cache() -> None:
+    '''
+    Drops every cached price history in this process
+    '''
+    _prices.clear()
+    _weekly.clear()
+
+@contextmanager
+def shared_prices(ticks: list):
+    '''
+    Loads each ticker once and copies it into shared memory for the duration of the block,
+    yielding the handles that attach_prices needs to map it inside a worker
+    '''
+    blocks = []
+    handles = {}
+    try:
+        for tick in set(ticks):
+            key = os.path.abspath(ticker_path(tick))
+            dates, closes = load_prices(key)
+            block = shared_memory.SharedMemory(create=True, size=max(dates.nbytes + closes.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(dates.shape, np.int64, block.buf)[:] = dates
+            np.ndarray(closes.shape, np.float64, block.buf, offset=dates.nbytes)[:] = closes
+            handles[key] = (block.name, len(dates))
+        yield handles
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+def _attach_block(name: str) -> shared_memory.SharedMemory:
+    '''
+    Opens an existing block, leaving its unlinking to the parent that created it. Pool workers
+    share the parent's resource tracker, so older Pythons registering it again is harmless
+    '''
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+def attach_prices(handles: dict) -> None:
+    '''
+    Pool initializer which maps the price histories shared by the parent into this worker's cache
+    '''
+    for key, (name, length) in handles.items():
+        if key in _prices:
+            continue
+        block = _attach_block(name)
+        _attached.append(block)
+        dates = np.ndarray((length,), np.int64, block.buf)
+        closes = np.ndarray((length,), np.float64, block.buf, offset=dates.nbytes)
+        _prices[key] = (dates, closes)
@@ -0,0 +1,77 @@
+'''
+Opt-in profiling of whole simulation runs. Setting params['profile'] on a run_* entry point
+profiles the parent process and every Pool worker, whose stats are merged into one pstats file
+('profile_output', profile.prof by default) with the top 'profile_top' functions by own time
+printed at the end of the run
+'''
+from contextlib import contextmanager
+from functools import wraps
+from multiprocessing import util
+import cProfile
+import os
+import pstats
+import shutil
+import tempfile
+
+_active: dict = {} # Profile and worker stats directory of the run being profiled in this process
+
+def profile_directory() -> str | None:
+    '''
+    Directory the workers of the profiled run write their stats to, None when not profiling
+    '''
+    return _active.get('directory')
+
+def start_worker_profile(directory: str) -> None:
+    '''
+    Profiles the rest of a Pool worker's life, its stats being written to the run's directory
+    when the worker exits. A profile inherited from a forked parent is stopped first
+    '''
+    if 'profile' in _active:
+        _active.pop('profile').disable()
+    _active.clear()
+    profile = cProfile.Profile()
+    path = os.path.join(directory, f'worker_{os.getpid()}.prof')
+    def dump() -> None:
+        profile.disable()
+        profile.dump_stats(path)
+    # Runs when the worker leaves its task loop, which a gracefully closed pool lets it do
+    util.Finalize(profile, dump, exitpriority=10)
+    profile.enable()
+
+@contextmanager
+def profile_run(params: dict):
+    '''
+    Profiles the enclosed run when params['profile'] is set, merging the parent's stats with
+    those the workers left in the run's directory. Nested runs are part of the outer one
+    '''
+    if not params.get('profile') or _active:
+        yield
+        return
+    _active['directory'] = tempfile.mkdtemp(prefix='stock_sim_profile_')
+    _active['profile'] = profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        directory = _active['directory']
+        _active.clear()
+        stats = pstats.Stats(profile)
+        workers = sorted(os.listdir(directory))
+        for name in workers:
+            stats.add(os.path.join(directory, name))
+        shutil.rmtree(directory, ignore_errors=True)
+        output = params.get('profile_output', 'profile.prof')
+        stats.dump_stats(output)
+        print(f"Profile of the parent and {len(workers)} workers saved to {output}")
+        pstats.Stats(output).sort_stats('tottime').print_stats(params.get('profile_top', 20))
+
+def profiled(run):
+    '''
+    Decorates a run_* entry point taking params first so params['profile'] profiles it
+    '''
+    @wraps(run)
+    def profiled_run(params: dict, *args, **kwargs):
+        with profile_run(params):
+            return run(params, *args, **kwargs)
+    return profiled_run
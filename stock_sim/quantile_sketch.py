@@ -0,0 +1,173 @@
+'''
+Mergeable streaming quantile sketch in the style of a merging t-digest, so statistical runs over
+millions of paths summarize their results in constant memory. Workers sketch their own paths and
+the parent merges the sketches, never holding one value per path. Integer results are counted
+exactly by an IntegerHistogram instead
+'''
+import numpy as np
+
+class QuantileSketch:
+    '''
+    Weighted centroids of a stream of values, sized by an arcsine scale so centroids near the
+    tails hold few values and quantiles there stay accurate. Keeps the exact count, min and max
+    '''
+    def __init__(self, compression: int = 200):
+        self.compression = compression # Upper bound on the number of centroids after compressing
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.buffer = [] # Arrays of values added since the last compression
+        self.buffered = 0
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values) -> None:
+        '''
+        Adds an array of values, compressing once enough values are buffered
+        '''
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not values.size:
+            return
+        self.count += values.size
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.buffer.append(values)
+        self.buffered += values.size
+        if self.buffered >= 5 * self.compression:
+            self.compress()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        '''
+        Absorbs the values summarized by another sketch
+        '''
+        other.compress()
+        if not other.count:
+            return
+        self.compress()
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._merge_centroids(np.concatenate([self.means, other.means]),
+                              np.concatenate([self.weights, other.weights]))
+
+    def compress(self) -> None:
+        '''
+        Folds the buffered values into the centroids
+        '''
+        if not self.buffer:
+            return
+        values = np.concatenate(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+        self._merge_centroids(np.concatenate([self.means, values]),
+                              np.concatenate([self.weights, np.ones(values.size)]))
+
+    def _merge_centroids(self, means: np.ndarray, weights: np.ndarray) -> None:
+        '''
+        Sorts weighted points and merges the neighbours falling in the same unit of the scale
+        function k(q) = compression * (asin(2q - 1) / pi + 1/2)
+        '''
+        order = np.argsort(means, kind='stable')
+        means = means[order]
+        weights = weights[order]
+        mid = (np.cumsum(weights) - weights / 2) / weights.sum()
+        k = np.floor(self.compression * (np.arcsin(2 * mid - 1) / np.pi + 0.5))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q):
+        '''
+        Estimated quantiles (0-1) of the values, interpolated between the centroid centers and
+        the exact min and max. NaN for an empty sketch
+        '''
+        self.compress()
+        if not self.count:
+            return np.full(np.shape(q), np.nan)[()]
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.r_[0, centers, self.count]
+        values = np.r_[self.min, self.means, self.max]
+        return np.interp(np.asarray(q) * self.count, positions, values)[()]
+
+    def percentile(self, p):
+        '''
+        Estimated percentiles (0-100) of the values
+        '''
+        return self.quantile(np.asarray(p) / 100)
+
+    def median(self) -> float:
+        return float(self.quantile(0.5))
+
+class IntegerHistogram:
+    '''
+    Exact mergeable counts of a stream of integer values, such as retirement years, in memory
+    bounded by their range. Quantiles match np.percentile's linear interpolation exactly, which
+    an interpolating sketch cannot do on discrete data
+    '''
+    def __init__(self):
+        self.low = 0 # Value counted by counts[0]
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _add_counts(self, low: int, counts: np.ndarray) -> None:
+        '''
+        Adds counts of the values from low upwards, widening the counted range when needed
+        '''
+        if not self.counts.size:
+            self.low, self.counts = low, counts.copy()
+            return
+        new_low = min(self.low, low)
+        size = max(self.low + self.counts.size, low + counts.size) - new_low
+        merged = np.zeros(size, dtype=np.int64)
+        merged[self.low - new_low:self.low - new_low + self.counts.size] += self.counts
+        merged[low - new_low:low - new_low + counts.size] += counts
+        self.low, self.counts = new_low, merged
+
+    def add(self, values) -> None:
+        '''
+        Counts an array of integer values
+        '''
+        values = np.asarray(values).ravel().astype(np.int64)
+        if not values.size:
+            return
+        low = int(values.min())
+        self._add_counts(low, np.bincount(values - low))
+        self.count += values.size
+        self.min = min(self.min, low)
+        self.max = max(self.max, int(values.max()))
+
+    def merge(self, other: "IntegerHistogram") -> None:
+        '''
+        Absorbs the counts of another histogram
+        '''
+        if not other.count:
+            return
+        self._add_counts(other.low, other.counts)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        '''
+        Exact quantiles (0-1) of the counted values, NaN for an empty histogram
+        '''
+        if not self.count:
+            return np.full(np.shape(q), np.nan)[()]
+        position = np.asarray(q, dtype=np.float64) * (self.count - 1)
+        below = np.floor(position)
+        # The sorted value at a rank is the first value whose cumulative count exceeds the rank
+        ranks = np.cumsum(self.counts)
+        lower = self.low + np.searchsorted(ranks, below, side='right')
+        upper = self.low + np.searchsorted(ranks, np.minimum(below + 1, self.count - 1), side='right')
+        return (lower + (upper - lower) * (position - below))[()]
+
+    def percentile(self, p):
+        '''
+        Exact percentiles (0-100) of the counted values
+        '''
+        return self.quantile(np.asarray(p) / 100)
+
+    def median(self) -> float:
+        return float(self.quantile(0.5))
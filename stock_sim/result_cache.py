@@ -0,0 +1,118 @@
+'''
+Opt-in on-disk cache of simulation results, content-addressed by a hash of the fully resolved
+parameters (seed included) and the engine version, so repeated sweeps over overlapping grids
+only simulate the cells they have not seen. Entries are small JSON files evicted oldest-used
+first once the directory grows past its size limit
+'''
+import hashlib
+import json
+import os
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'database', 'results')
+ENGINE_VERSION = 2 # Bump whenever a change to the engine alters simulation results
+# Parameters that never change a result
+IGNORED_KEYS = ('record', 'display_tax_ratio', 'is_multi_sim', 'plot_output', 'plot_format',
+                'profile', 'profile_output', 'profile_top')
+
+def reproducible(params: dict) -> bool:
+    '''
+    Whether a parameter set always produces the same result, which is what makes it cacheable.
+    Random backtest start weeks, stochastic and bootstrapped growth all need a seed
+    '''
+    if params['backtest']:
+        return params['start_date'] != 'random' or params.get('seed') is not None
+    if params.get('bootstrap') or not params['use_avg_growth']:
+        return params.get('seed') is not None
+    return True
+
+def params_key(params: dict) -> str:
+    '''
+    Stable hash of a resolved parameter set and the engine version, independent of key order
+    '''
+    resolved = {name: value for name, value in params.items() if name not in IGNORED_KEYS}
+    payload = json.dumps([ENGINE_VERSION, resolved], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class ResultCache:
+    '''
+    Directory of multiprocess_sim results named by the hash of their parameters
+    '''
+    def __init__(self, directory: str = RESULTS_DIR, max_bytes: int = 64 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def path(self, key: str) -> str:
+        '''
+        Location of an entry, fanned out over subdirectories by the first byte of its key
+        '''
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def get(self, params: dict) -> tuple | None:
+        '''
+        The cached result of a parameter set, or None when it is missing or not cacheable
+        '''
+        if not reproducible(params):
+            return None
+        path = self.path(params_key(params))
+        try:
+            with open(path, 'r') as file:
+                result = json.load(file)
+            os.utime(path) # Marks the entry as recently used for eviction
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return tuple(result)
+
+    def put(self, params: dict, result: tuple) -> None:
+        '''
+        Stores the result of a cacheable parameter set
+        '''
+        if not reproducible(params):
+            return
+        path = self.path(params_key(params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written to a temporary name and swapped in so concurrent runs never read partial entries
+        with open(f'{path}.{os.getpid()}.tmp', 'w') as file:
+            json.dump(result, file)
+        os.replace(f'{path}.{os.getpid()}.tmp', path)
+        self.writes += 1
+
+    def evict(self) -> None:
+        '''
+        Deletes the least recently used entries until the cache fits in max_bytes
+        '''
+        entries = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.json'):
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((stat.st_mtime_ns, stat.st_size, os.path.join(root, name)))
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            os.remove(path)
+            size -= entry_size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        '''
+        Hit, miss, write and eviction counts of this run
+        '''
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes,
+                "evictions": self.evictions}
+
+def format_result_cache_stats(stats: dict) -> str:
+    '''
+    One line summary of how many simulations the result cache saved
+    '''
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    hit_rate = 100 * stats.get("hits", 0) / lookups if lookups else 0
+    return (f"Result cache: {stats.get('hits', 0):,} hits, {stats.get('misses', 0):,} misses "
+            f"({hit_rate:.1f}% hit rate), {stats.get('writes', 0):,} writes, "
+            f"{stats.get('evictions', 0):,} evictions")
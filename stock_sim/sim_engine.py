@@ -3,22 +3,70 @@ DOCSTRING
 This module allows for development and testing of investment strategies from a high level
 '''
 from statistics import median
+from contextlib import contextmanager, nullcontext
+from decimal import Decimal
 from multiprocessing import Pool
 import numpy as np
 import time
 
-from stock_sim.utils import pick_random_date
 from .finance import *
-from .visualization import *
-import cProfile
-import pstats
-import io
+from .batch_engine import run_batch_sim
+from .price_cache import attach_prices, shared_prices
+from .profiling import profile_directory, profiled, start_worker_profile
+from .quantile_sketch import IntegerHistogram, QuantileSketch
+from .result_cache import ResultCache, format_result_cache_stats, reproducible
+from .taxes import configure_tax_cache_for, format_cache_stats, merge_cache_stats, tax_cache
 import os
 
+RECORDING_WEEKS = { # Weeks of each year a recording resolution stores a point at
+    "none": (),
+    "yearly": (52,),
+    "monthly": tuple(round(52*month/12) for month in range(1, 13)),
+    "weekly": tuple(range(1, 53)),
+}
+
+STAT_FIELDS = ("net_assets", "cash", "retirement_year") # Results the statistical sims keep per path
+# Streaming summary of each stat field, integer retirement years being counted exactly
+STAT_SUMMARIES = {"net_assets": QuantileSketch, "cash": QuantileSketch, "retirement_year": IntegerHistogram}
+PERCENTILES = (5, 25, 50, 75, 95) # Percentiles create_stat_graph reports
+STREAM_BLOCK = 65536 # Most paths a stat sim block simulates before summarizing them
+MIN_ROUNDS = 4 # Rounds a convergence run needs before estimating its confidence intervals
+# Two-sided 95% Student t values by degrees of freedom, taken at the nearest lower tabulated df
+T_CRITICAL = ((1, 12.71), (2, 4.30), (3, 3.18), (4, 2.78), (5, 2.57), (6, 2.45), (8, 2.31),
+              (10, 2.23), (15, 2.13), (20, 2.09), (30, 2.04), (60, 2.00), (120, 1.98))
+
+def recording_weeks(resolution: str) -> list[bool]:
+    '''
+    Flags indexed by week number (1-52) of the weeks a recording resolution stores
+    '''
+    if resolution not in RECORDING_WEEKS:
+        raise ValueError(f"Unknown recording resolution {resolution!r}, expected one of {list(RECORDING_WEEKS)}")
+    flags = [False]*53
+    for week in RECORDING_WEEKS[resolution]:
+        flags[week] = True
+    return flags
+
+def plot_path(params: dict, name: str) -> str | None:
+    '''
+    File a graph is saved to when 'plot_output' names a directory, in the 'plot_format' (png or
+    svg) defaulting to png, so headless runs render without a GUI. None shows graphs instead
+    '''
+    if not params.get('plot_output'):
+        return None
+    os.makedirs(params['plot_output'], exist_ok=True)
+    return os.path.join(params['plot_output'], f"{name}.{params.get('plot_format', 'png')}")
+
 def run_sim(**kwargs) -> list:
     '''
-    Main numerical simulation method - weekly datapoints, quarterly dividends, paychecks, taxes
+    Main numerical simulation method - weekly datapoints, quarterly dividends, paychecks, taxes.
+    The 'record' resolution (none, yearly, monthly or weekly) sets how often the asset and cash
+    series are stored, defaulting to weekly when check_negative is on.
+    Optional stop conditions end the run early with a "pruned" status as soon as the minimum cash
+    drops below 'stop_min_cash' or, with 'stop_negative', the net assets go negative, and
+    'stop_at_retirement' ends it with a "retired" status once the retirement year is found.
+    'tax_cache_resolution' and 'tax_cache_capacity' set the tax cache the run's taxes go through
     '''
+    configure_tax_cache_for(kwargs)
     # Assigning kwargs to local variables
     expenses = sum(kwargs['expenses'].values()) if isinstance(kwargs['expenses'], dict) else kwargs['expenses']
     annual_tax = kwargs['annualized_taxes']
@@ -31,11 +79,9 @@ def run_sim(**kwargs) -> list:
     cash_floor = kwargs['cash_floor']
     cash_ceiling = kwargs['cash_ceiling']
     retirement_income_goal = kwargs['retirement_income_goal']
-    # Handle the dynamic 'start_date' field in config
-    if kwargs['start_date'] == "random" and kwargs['backtest']:
-        duration = kwargs["years"]
-        start = pick_random_date(kwargs["backtest_ticker"], duration)
-        kwargs['start_date'] = start
+    # A "random" start date leaves weekly_growth to draw the start week uniformly over every
+    # week with a full window of data after it, like the batch engine
+    start_date = None if kwargs['start_date'] == "random" else kwargs['start_date']
     # Setting up Investment class with starting params
     invest = Investments(
                         kwargs['start_cash'],
@@ -44,89 +90,134 @@ def run_sim(**kwargs) -> list:
                         kwargs['dividend_growth'],
                         expenses,
                         kwargs['taxes'],
-                        std_dev=kwargs['std_dev'],
+                        std_dev=0 if kwargs['use_avg_growth'] else kwargs['std_dev'],
                         years=kwargs['years'],
                         backtest=kwargs['backtest'], 
-                        fixed_start_date=kwargs['start_date'],
-                        tick=kwargs['backtest_ticker']
+                        fixed_start_date=start_date,
+                        tick=kwargs['backtest_ticker'],
+                        seed=kwargs.get('seed'),
+                        bootstrap_block=kwargs['bootstrap_block_weeks'] if kwargs.get('bootstrap') else 0,
+                        bootstrap_ticks=kwargs.get('bootstrap_tickers'),
+                        antithetic=kwargs.get('antithetic', False)
                         )
-    invest.assets['stocks'] = kwargs['start_cash']
-    invest.assets['cash'] = 0
-    invest.assets['bonds'] = 0
+    invest.stocks = kwargs['start_cash']
+    invest.cash = 0
+    invest.bonds = 0
 
-    # Defining flags and precomputed values
-    min_cash = {"val": kwargs['start_cash'], "year": -1}
+    # Defining flags and precomputed values, resolving every parameter the weekly loop reads once
+    min_cash_val = kwargs['start_cash']
+    min_cash_year = -1
     pre_tax_dividend = kwargs['pre_tax_dividend']
-    assets_over_time = [0]
-    cash_over_time = [0]
+    stop_min_cash = kwargs.get('stop_min_cash')
+    stop_negative = kwargs.get('stop_negative', False)
+    stop_at_retirement = kwargs.get('stop_at_retirement', False)
+    status = "completed"
+    check_negative = kwargs['check_negative']
+    cash_injection_year = kwargs['cash_injection_year']
+    promotion = kwargs['promotion']
+    promotion_years = promotion['years'] if promotion['enabled'] else ()
+    loan_length = kwargs['loan_length']
+    retirement_usage = kwargs['retirement_usage']
+    raise_factor = kwargs['raise_factor']
+    invest_amount = invest.strategy_function(kwargs['strategy'], kwargs['invest_factor'],
+                                             kwargs['cash_base_factor'], kwargs['cash_base_amt'],
+                                             cash_ceiling)
+    growth_path = invest.growth_path()
+    growth_idx = invest.growth_idx
+    record_at = recording_weeks(kwargs.get('record', 'weekly' if check_negative else 'none'))
+    # Series are preallocated with the starting zero point followed by every recorded week
+    points = 1 + sum(record_at)*invest.years
+    assets_over_time = np.zeros(points)
+    cash_over_time = np.zeros(points)
+    point = 1
     was_negative = [False, False]
     retirement_year = -1
     weekly_expenses = invest.get_weekly_expenses() if isinstance(expenses, dict) else expenses*12/52
-    if kwargs['use_avg_growth']:
-        invest.std_dev = 0
     div_tax = 0
 
     # Main loop staged between years and weeks (52 weeks per year)
     for year in range(invest.years):
         invest.week = 0
         # Handling yearly events and checks
-        if year == kwargs['cash_injection_year']:
+        if year == cash_injection_year:
             invest.add_cash(kwargs['cash_injection_amt'], cash_floor)
-        if kwargs['promotion']['enabled'] and year in kwargs['promotion']['years']:
-            promotion_year_index = kwargs['promotion']['years'].index(year)
-            invest.set_income(kwargs['promotion']['salaries'][promotion_year_index])
+        if year in promotion_years:
+            promotion_year_index = promotion_years.index(year)
+            invest.set_income(promotion['salaries'][promotion_year_index])
 
         house_loan_month = month_mortgage if year > house_start_year and house_loan else 0
         if year == house_start_year and house_loan:
             invest.subtract_value(down_pay_amt, cash_floor)
 
-        house_loan_month = 0 if year > house_start_year + kwargs['loan_length'] else house_loan_month
+        house_loan_month = 0 if year > house_start_year + loan_length else house_loan_month
 
         house_payment_week = house_loan_month*12/52
         weekly_income = invest.get_weekly_income()
         annual_dividends = 0
+        # Income only changes between years, so the stock value needed to retire and the
+        # biweekly paycheck do too
+        retirement_stocks = (invest.retirement_threshold(retirement_usage, retirement_income_goal)
+                             if retirement_year == -1 else float('inf'))
+        net_week = weekly_income - weekly_expenses - house_payment_week
+        paycheck = (2*net_week if annual_tax
+                    else (2*net_week-2*invest.calculate_taxes_owed_cached(invest.income)[1]/52))
 
         for week in range(1,53):
             '''
             Biweekly paycheck, calculate the net cash gain, run the compounding formula after
             investing a fixed percentage of income or cash, and calculate dividends once per quarter
             '''
-            net_week = 0
             post_tax = 0
-            curr_cash = invest.assets['cash']
-            if curr_cash < min_cash['val'] and year > 0:
-                min_cash['val'] = curr_cash
-                min_cash['year'] = year
+            curr_cash = invest.cash
+            if curr_cash < min_cash_val and year > 0:
+                min_cash_val = curr_cash
+                min_cash_year = year
+                if stop_min_cash is not None and curr_cash < stop_min_cash:
+                    status = "pruned"
+                    break
             if week%2 == 0:
-                net_week = weekly_income - weekly_expenses - house_payment_week
-                post_tax = (2*net_week if annual_tax
-                            else (2*net_week-2*invest.calculate_taxes_owed_cached(invest.income)[1]/52))
-                #print(f"Net week: {net_week}, post-tax: {post_tax}, weekly income: {weekly_income}, weekly_expenses: {weekly_expenses}")
-                invest.add_cash(post_tax, cash_floor)
-            invest.run_investment_strategy(post_tax, strategy=kwargs['strategy'],
-                                           invest_factor=kwargs['invest_factor'],
-                                           cash_base_factor=kwargs['cash_base_factor'],
-                                           cash_base_amt=kwargs['cash_base_amt'],
-                                           cash_ceiling = cash_ceiling)
+                post_tax = paycheck
+                if post_tax < 0:
+                    invest.subtract_value(-1*post_tax, cash_floor)
+                else:
+                    invest.cash += post_tax
+            # Compound the week's growth and invest, as Investments.compound_stocks does
+            contribution = invest_amount(post_tax)
+            invest.stocks *= growth_path[growth_idx]
+            growth_idx += 1
+            if invest.cash >= contribution:
+                invest.stocks += contribution
+                invest.cash -= contribution
+                invest.contributions += contribution
             if week%13 == 0: # finds quarters
                 dividend = invest.get_dividends()
                 if (pre_tax_dividend):
                     tax_amt = invest.calculate_taxes_owed_cached(invest.income, dividend / 4)[0]['federal_dividend']
-                    #print("Div to tax:", dividend, tax_amt)
-                    invest.assets['stocks'] += dividend-tax_amt
+                    invest.stocks += dividend-tax_amt
                 else:
-                    invest.assets['stocks'] += dividend
+                    invest.stocks += dividend
                 annual_dividends += dividend
-            if kwargs['check_negative']:
-                val = invest.get_asset_value()
-                assets_over_time.append(val)
-                cash = invest.assets['cash']
-                cash_over_time.append(cash)
+            if check_negative:
+                cash = invest.cash
+                val = cash + invest.stocks + invest.bonds
                 was_negative[0] = True if cash < 0 else was_negative[0]
                 was_negative = [True, True] if val < 0 else was_negative
+            if stop_negative and invest.cash + invest.stocks + invest.bonds < 0:
+                status = "pruned"
+                break
+            if record_at[week]:
+                cash = invest.cash
+                assets_over_time[point] = cash + invest.stocks + invest.bonds
+                cash_over_time[point] = cash
+                point += 1
             invest.week += 1
-            if invest.calculate_passive_income(kwargs['retirement_usage']) >= retirement_income_goal and retirement_year == -1:
+            if retirement_year == -1 and invest.stocks >= retirement_stocks:
                 retirement_year = year
+                if stop_at_retirement:
+                    status = "retired"
+                    break
+        if status != "completed":
+            break
         # Subtract taxes once per year
         if annual_tax:
             tax_amt = invest.calculate_taxes_owed_cached(invest.income, annual_dividends)[1]
@@ -136,41 +227,107 @@ def run_sim(**kwargs) -> list:
             tax_amt = invest.calculate_taxes_owed_cached(invest.income, annual_dividends)[0]['federal_dividend']
             div_tax = tax_amt
             invest.subtract_value(tax_amt)
-        invest.income *= kwargs['raise_factor']
+        invest.income *= raise_factor
         invest.year += 1
+    invest.growth_idx = growth_idx
+    min_cash = {"val": min_cash_val, "year": min_cash_year}
     if min_cash['year'] == -1:
         min_cash['val'] = cash_ceiling
     vals = [
             invest.get_income(),
             invest.get_all_values(),
-            invest.calculate_passive_income(kwargs['retirement_usage']),
+            invest.calculate_passive_income(retirement_usage),
             [assets_over_time, cash_over_time],
             div_tax,
             was_negative,
             min_cash,
-            retirement_year
+            retirement_year,
+            status
             ]
     #print(f"Contributions: {invest.contributions}, Assets: {invest.get_all_values()[1]}, Net Growth: {invest.get_all_values()[1]-invest.contributions}")
     return vals
 
-def multiprocess_sim(parameter: dict) -> tuple[float, float, float, bool, dict]:
+def backtest_ticks(params: dict) -> list:
     '''
-    For use within multiprocessing to allow the simulations to be run and resultant independently
+    Tickers whose price history the workers of a simulation need
     '''
-    # profile_dir = "profiles"
-    # if not os.path.exists(profile_dir):
-    #     os.makedirs(profile_dir)
-    # pr = cProfile.Profile()
-    # pr.enable()
+    if params['backtest']:
+        return [params['backtest_ticker']]
+    if params.get('bootstrap'):
+        return params.get('bootstrap_tickers') or [params['backtest_ticker']]
+    return []
 
-    # Your simulation logic here
-    results = run_sim(**parameter)
+def apply_changes(params: dict, changes: dict) -> dict:
+    '''
+    Copy of params with changes applied, where dotted names like "promotion.salaries" set a key of
+    a nested dict, copying only the dicts along that path
+    '''
+    resolved = dict(params)
+    for name, value in changes.items():
+        *path, key = name.split('.')
+        target = resolved
+        for part in path:
+            target[part] = dict(target[part])
+            target = target[part]
+        target[key] = value
+    return resolved
+
+_base_params: dict = {} # Parameters shared by every task of a pool, installed once per worker
+
+def init_worker(prices: dict, base_params: dict, profile_dir: str = None) -> None:
+    '''
+    Pool initializer mapping the shared price histories and installing the base parameters,
+    so each task only has to carry the parameters it changes, and sizing the worker's tax cache
+    from them. Workers of a profiled run profile themselves into profile_dir
+    '''
+    if profile_dir is not None:
+        start_worker_profile(profile_dir)
+    attach_prices(prices)
+    _base_params.clear()
+    _base_params.update(base_params)
+    configure_tax_cache_for(base_params)
+
+@contextmanager
+def simulation_pool(params: dict):
+    '''
+    Pool whose workers have the price histories and base parameters of a simulation installed
+    '''
+    profile_dir = profile_directory()
+    with shared_prices(backtest_ticks(params)) as prices, \
+            Pool(initializer=init_worker, initargs=(prices, params, profile_dir)) as pool:
+        yield pool
+        if profile_dir is not None:
+            # Workers only write their profiles when they exit on their own rather than being terminated
+            pool.close()
+            pool.join()
+
+def root_seeded(params: dict) -> dict:
+    '''
+    Params with a root seed for runs that draw random numbers. An unseeded random run gets a fresh
+    one, printed so the run can be repeated, which every cell of the run then shares: cells see
+    the same market paths and their differences come from the parameters rather than the noise
+    '''
+    if reproducible(params):
+        return params
+    seed = int(np.random.SeedSequence().entropy)
+    print(f"Root seed: {seed}")
+    return dict(params, seed=seed)
 
-    # pr.disable()
-    
-    # # Save profiling data to a binary file (e.g., .prof)
-    # profile_file = os.path.join(profile_dir, f"profile_worker_{os.getpid()}.prof")
-    # pr.dump_stats(profile_file)
+def task_seeds(params: dict, count: int, first: int = 0) -> list[int]:
+    '''
+    Seeds of paths first to first+count, spawned from the parameters' root seed. Path n always
+    gets the same seed whatever the path count or the number of workers, so runs sharing a root
+    seed are paired path by path
+    '''
+    return [int(np.random.SeedSequence(params.get('seed'), spawn_key=(n,)).generate_state(1)[0])
+            for n in range(first, first + count)]
+
+def multiprocess_sim(parameter: dict) -> tuple[float, float, float, list, float, int, str]:
+    '''
+    For use within multiprocessing to allow the simulations to be run and resultant independently
+    '''
+    # Simulation without the series that are discarded below
+    results = run_sim(**{**parameter, 'record': 'none'})
 
     net_assets = results[1][0] + results[1][1]
     cash_results = results[1][0]
@@ -178,55 +335,112 @@ def multiprocess_sim(parameter: dict) -> tuple[float, float, float, bool, dict]:
     was_negative = results[5]
     min_cash = results[6]['val']
     retirement_year = results[7]
+    status = results[8]
+
+    return net_assets, cash_results, div_tax, was_negative, min_cash, retirement_year, status
+
+def indexed_multiprocess_sim(task: tuple) -> tuple:
+    '''
+    multiprocess_sim of the installed base parameters updated with a task's changes, tagged with
+    the task's index so results arriving out of order can be placed, plus the worker's tax cache
+    counts since its previous task
+    '''
+    index, changes = task
+    return index, multiprocess_sim(apply_changes(_base_params, changes)), tax_cache.stats(reset=True)
+
+def pool_chunksize(tasks: int, workers: int = None) -> int:
+    '''
+    Tasks handed to a worker at a time, about four chunks per worker so dispatch overhead stays
+    small while the last chunks still balance across workers
+    '''
+    workers = workers or os.cpu_count() or 1
+    chunksize, extra = divmod(tasks, workers * 4)
+    return max(1, chunksize + bool(extra))
+
+def stream_cells(params: dict, cells: list[dict], cache: ResultCache, pool: Pool, cache_stats: dict):
+    '''
+    Yields the (cell index, multiprocess_sim result) of every cell as it completes, cells found in
+    the result cache first and the rest streamed through the pool in chunks without a barrier
+    between them. Worker tax cache counts are merged into cache_stats
+    '''
+    param_list = []
+    for idx, changes in enumerate(cells):
+        result = cache.get(apply_changes(params, changes)) if cache is not None else None
+        if result is None:
+            param_list.append((idx, changes))
+        else:
+            yield idx, result
+    simulated = pool.imap_unordered(indexed_multiprocess_sim, param_list,
+                                    chunksize=pool_chunksize(len(param_list)))
+    for idx, result, stats in simulated:
+        merge_cache_stats(cache_stats, stats)
+        if cache is not None:
+            cache.put(apply_changes(params, cells[idx]), result)
+        yield idx, result
+
+@profiled
+def run_cells(params: dict, cells: list[dict], cache: ResultCache = None, pool: Pool = None,
+              progress_every: int = None) -> list[tuple]:
+    '''
+    multiprocess_sim of the base parameters updated with each cell's changes, returned in cell
+    order. Cells found in the result cache are not simulated, and a simulation pool is opened
+    for the call unless one is given, its workers sharing the root seed of an unseeded random run
+    '''
+    results = [None]*len(cells)
+    if pool is None:
+        params = root_seeded(params)
+
+    # Multiprocessing to handle running each simulation on separate threads in parallel (timed)
+    iterations = len(cells)
+    progress_every = progress_every or max(1, iterations // 10)
+    cache_stats = {}
+    start_time = time.perf_counter()
+    with (simulation_pool(params) if pool is None else nullcontext(pool)) as pool:
+        for iteration_idx, (idx, result) in enumerate(stream_cells(params, cells, cache, pool, cache_stats), start=1):
+            results[idx] = result
+            if iteration_idx % progress_every == 0 or iteration_idx == iterations:
+                print(f'Completed {iteration_idx}/{iterations}')
 
-    return net_assets, cash_results, div_tax, was_negative, min_cash, retirement_year
+    end_time = time.perf_counter()
+    print(f"The simulation took {end_time-start_time:,.2f} seconds")
+    print(format_cache_stats(cache_stats))
+    if cache is not None:
+        cache.evict()
+        print(format_result_cache_stats(cache.stats()))
+    return results
 
-def run_2v_sims(params: dict, dimX: dict, dimY: dict) -> dict:
+def axis_values(dim: dict) -> list:
+    '''
+    Values a swept dimension takes, either listed as {name, values} or stepped as
+    {name, min, max, increment}. Stepped values are rounded to the decimals of min and
+    increment so the steps do not accumulate rounding error
+    '''
+    if 'values' in dim:
+        return list(dim['values'])
+    min_v = dim['min']
+    max_v = dim['max']
+    increment = dim['increment']
+    count = int((max_v - min_v) / increment + 1e-9) + 1
+    if all(isinstance(bound, int) for bound in (min_v, max_v, increment)):
+        return [min_v + n * increment for n in range(count)]
+    decimals = max(0, *(-Decimal(str(bound)).as_tuple().exponent for bound in (min_v, increment)))
+    return [round(min_v + n * increment, decimals) for n in range(count)]
+
+@profiled
+def run_2v_sims(params: dict, dimX: dict, dimY: dict, cache: ResultCache = None) -> dict:
     '''
-    Observe large scale effects resulting from changing two variables
+    Observe large scale effects resulting from changing two variables,
+    only simulating the cells missing from the result cache when one is given
     '''
     # dimX format: {min_x, max_x, x_increment, x_parameter}
     # Simulation variable bound assignment
     params['use_avg_growth'] = True
 
-    min_x = dimX['min']
-    max_x = dimX['max']
-    x_increment = dimX['increment']
-
-    min_y = dimY['min']
-    max_y = dimY['max']
-    y_increment = dimY['increment']
-
-    raw_x = []
-    x_set = []
-    raw_y = []
-    y_set = []
-
-    # Defining the set of values to be used in the x-axis
-    if (isinstance(min_x, float) or isinstance(max_x, float) or isinstance(x_increment, float)):
-        min_x = int(min_x * 1000)
-        max_x = int(max_x * 1000)
-        x_increment = int(x_increment * 1000)
-        raw_x = [float(n)/1000 for n in range(min_x, max_x + 1, x_increment)]
-        x_set = list(enumerate(raw_x))
-    elif (dimX['name'] == "promotion"):
-        pass
-    else:
-        raw_x = list(range(min_x, max_x + 1, x_increment))
-        x_set = list(enumerate(raw_x))
-
-    # Defining the set of values to be used in the y-axis
-    if (isinstance(min_y, float) or isinstance(max_y, float) or isinstance(y_increment, float)):
-        min_y = int(min_y * 1000)
-        max_y = int(max_y * 1000)
-        y_increment = int(y_increment * 1000)
-        raw_y = [float(n)/1000 for n in range(min_y, max_y + 1, y_increment)]
-        y_set = list(enumerate(raw_y))
-    elif dimY['name'] == "promotion":
-        pass
-    else:
-        raw_y = list(range(min_y, max_y + 1, y_increment))
-        y_set = list(enumerate(raw_y))
+    # Defining the set of values to be used in the x and y axes
+    raw_x = axis_values(dimX)
+    x_set = list(enumerate(raw_x))
+    raw_y = axis_values(dimY)
+    y_set = list(enumerate(raw_y))
 
     # Defining empty arrays to populate with results
     net_assets = [[0 for _ in range(len(y_set))] for _ in range(len(x_set))]
@@ -235,38 +449,18 @@ def run_2v_sims(params: dict, dimX: dict, dimY: dict) -> dict:
     contained_negative = [[[False, False] for _ in range(len(y_set))] for _ in range(len(x_set))]
     min_cash = [[{"val": 0, "year": -1} for _ in range(len(y_set))] for _ in range(len(x_set))]
     retirement_year = [[0 for _ in range(len(y_set))] for _ in range(len(x_set))]
-    # Setting up an array of modified parameters based on the changing variables in multiprocessing
-    param_list = [[{} for _ in range(len(y_set))] for _ in range(len(x_set))]
-    for x in enumerate(x_set):
-        for y in enumerate(y_set):
-            params[dimX['name']] = x[1][1]
-            params[dimY['name']] = y[1][1]
-            param_list[x[0]][y[0]] = dict(params)
-
-    # Multiprocessing to handle running each simulation on separate threads in parallel (timed)
-    print(len(param_list), len(param_list[0]))
-    iterations = len(param_list) * len(param_list[0])
-    iteration_idx = 0
-    start_time = time.perf_counter()
-    with Pool() as pool:
-        '''
-        Each 1D array within the 2D list of modified parameters
-        is passed into the pool for multiprocessing, where the
-        results are expanded to populate the result value arrays
-        in their corresponding indices
-        '''
-        for param in enumerate(param_list):
-            print(f'Batch {iteration_idx}/{len(param_list)}')
-            iteration_idx += 1
-            multisim_results = pool.map(multiprocess_sim, param[1])
-            for n in enumerate(multisim_results):
-                net_assets[param[0]][n[0]],\
-                cash_results[param[0]][n[0]],\
-                div_tax[param[0]][n[0]], contained_negative[param[0]][n[0]], \
-                min_cash[param[0]][n[0]], retirement_year[param[0]][n[0]] = n[1]
-                
-    end_time = time.perf_counter()
-    print(f"The simulation took {end_time-start_time:,.2f} seconds")
+    status = [["completed" for _ in range(len(y_set))] for _ in range(len(x_set))]
+    # Setting up a flat list of parameter changes, one per grid cell in row order
+    param_list = [{dimX['name']: x[1], dimY['name']: y[1]} for x in x_set for y in y_set]
+
+    print(len(x_set), len(y_set))
+    results = run_cells(params, param_list, cache, progress_every=max(1, len(y_set)))
+    for idx, result in enumerate(results):
+        x_idx, y_idx = divmod(idx, len(y_set))
+        net_assets[x_idx][y_idx],\
+        cash_results[x_idx][y_idx],\
+        div_tax[x_idx][y_idx], contained_negative[x_idx][y_idx], \
+        min_cash[x_idx][y_idx], retirement_year[x_idx][y_idx], status[x_idx][y_idx] = result
 
     # Determine how to transform the raw cash values to a tax ratio
     if params['display_tax_ratio']:
@@ -295,9 +489,15 @@ def run_2v_sims(params: dict, dimX: dict, dimY: dict) -> dict:
                     tax_factor = -0.1
                 cash_results[n[0]][m[0]] = tax_factor
 
+    # Runs pruned by a stop condition ended early, so their partial values are masked out
+    # of the medians and plots instead of showing as real outcomes
+    for x_idx, y_idx in ((x[0], y[0]) for x in x_set for y in y_set):
+        if status[x_idx][y_idx] == "pruned":
+            net_assets[x_idx][y_idx] = cash_results[x_idx][y_idx] = min_cash[x_idx][y_idx] = np.nan
+
     # Handling data to be plotted
-    med_assets = np.median(net_assets)
-    med_cash = np.median(cash_results)
+    med_assets = np.nanmedian(net_assets)
+    med_cash = np.nanmedian(cash_results)
     print(f"Median Net Assets: {med_assets:,.2f}\nMedian Net Cash: {med_cash:,.2f}")
 
     z = net_assets
@@ -307,84 +507,188 @@ def run_2v_sims(params: dict, dimX: dict, dimY: dict) -> dict:
     z2title="Resulting Cash ($)"
     if params['display_tax_ratio']:
         z2title = "Cash-Tax Ratio Bracket (0-1)"
+    from .visualization import create_3d_graph
     create_3d_graph(raw_y, raw_x, z, dimY['name'], dimX['name'], ztitle, z2, z2title,
-                   params['display_tax_ratio'], params['check_negative'])
-    return ({"Net": z, "Cash": cash_results, "min_cash": min_cash, "retirement_year": retirement_year})
+                   params['display_tax_ratio'], params['check_negative'],
+                   plot_path(params, f"2v_{dimX['name']}_{dimY['name']}"))
+    return ({"Net": z, "Cash": cash_results, "min_cash": min_cash, "retirement_year": retirement_year,
+             "status": status})
 
-def run_stat_sim(params: dict, sim_count: int = 100) -> None:
+def percentile_intervals(round_percentiles: list) -> np.ndarray:
     '''
-    Generate a distribution of results from time variant samples with fixed parameters
+    Half widths of the 95% confidence intervals of the reported percentiles, from the spread of
+    the percentiles of independent rounds of paths (batch means)
     '''
-    # Set up arrays and parameters for results
-    params['use_avg_growth'] = False
-    sims = list(range(sim_count))
-    net_assets = list(range(sim_count))
-    cash_results = list(range(sim_count))
+    rounds = np.array(round_percentiles)
+    t_value = [value for df, value in T_CRITICAL if df <= len(rounds) - 1][-1]
+    return t_value * rounds.std(axis=0, ddof=1) / len(rounds)**0.5
 
-    # Prepare an array of parameters to feed into the multiprocessor
-    param_set = [params for _ in range(sim_count)]
+def path_changes(params: dict, first: int, count: int, antithetic: bool) -> list[dict]:
+    '''
+    Parameter changes of paths first to first+count, each seeded by its path number. The twin of
+    an antithetic pair shares the seed of its first path with mirrored growth shocks
+    '''
+    if antithetic:
+        seeds = task_seeds(params, count // 2, first // 2)
+        return [{'seed': seeds[n // 2], 'antithetic': bool(n % 2)} for n in range(count)]
+    return [{'seed': seed} for seed in task_seeds(params, count, first)]
 
-    # Multiprocessing used to run the each simulation, unordered
+def summarize_block(first: int, values: dict, sample_paths: int) -> tuple[dict, dict]:
+    '''
+    Streaming summaries of a block of paths' results and the values of its paths that fall in the
+    first sample_paths paths, the only ones shipped back individually
+    '''
+    sketches = {field: STAT_SUMMARIES[field]() for field in STAT_FIELDS}
+    for field in STAT_FIELDS:
+        sketches[field].add(values[field])
+    return sketches, {field: values[field][:max(0, sample_paths - first)] for field in STAT_FIELDS}
+
+def stat_block_sim(task: tuple) -> tuple:
+    '''
+    Simulates a block of paths of the installed base parameters in a worker, returning the
+    block's first path, sketches and sample plus the worker's tax cache counts
+    '''
+    first, count, antithetic, sample_paths = task
+    values = {field: np.empty(count) for field in STAT_FIELDS}
+    for n, changes in enumerate(path_changes(_base_params, first, count, antithetic)):
+        result = multiprocess_sim(apply_changes(_base_params, changes))
+        values['net_assets'][n] = result[0]
+        values['cash'][n] = result[1]
+        values['retirement_year'][n] = result[5]
+    return first, *summarize_block(first, values, sample_paths), tax_cache.stats(reset=True)
+
+def stat_blocks(params: dict, first: int, count: int, antithetic: bool, pool: Pool, sample_paths: int):
+    '''
+    Yields the (first path, sketches, sample) of blocks covering paths first to first+count,
+    simulated by the pool's workers or, without a pool, on the vectorized engine
+    '''
+    if pool is None:
+        for block_first in range(first, first + count, STREAM_BLOCK):
+            block_count = min(STREAM_BLOCK, first + count - block_first)
+            # The first block draws from the root seed, later ones from seeds spawned from it
+            seed = params.get('seed') if block_first == 0 else task_seeds(params, 1, block_first)[0]
+            results = run_batch_sim(dict(params, antithetic=antithetic), block_count, seed=seed)
+            yield block_first, *summarize_block(block_first, results, sample_paths)
+        return
+    # Blocks of about four per worker, antithetic pairs never being split
+    block = min(STREAM_BLOCK, pool_chunksize(count))
+    block += block % 2 if antithetic else 0
+    tasks = [(block_first, min(block, first + count - block_first), antithetic, sample_paths)
+             for block_first in range(first, first + count, block)]
+    for block_first, sketches, sample, _ in pool.imap_unordered(stat_block_sim, tasks):
+        yield block_first, sketches, sample
+
+def stat_paths(params: dict, sim_count: int, batch: bool, antithetic: bool, tolerance: float,
+               max_paths: int, field: str, sample_paths: int = 10000) -> dict:
+    '''
+    Simulates rounds of sim_count paths of fixed parameters. Without a tolerance a single round is
+    run, with one rounds are added until the 95% confidence interval of every reported percentile
+    of field is within +/- tolerance or max_paths have run.
+    Results are streamed into a quantile sketch per field, or an exact histogram for the integer
+    retirement years, so memory stays constant however many paths run, and only the first sample_paths paths are kept individually for plotting.
+    Returns the sketches and sample with the path count and the final interval half widths
+    '''
+    params['use_avg_growth'] = False
+    params = root_seeded(params)
+    if antithetic and (params['backtest'] or params.get('bootstrap')):
+        raise ValueError("Antithetic paths need normally distributed growth, not historical returns")
+    # Antithetic pairs are never split between rounds
+    count = sim_count + sim_count % 2 if antithetic else sim_count
+    sketches = {name: STAT_SUMMARIES[name]() for name in STAT_FIELDS}
+    sample = {name: np.empty(sample_paths) for name in STAT_FIELDS}
+    paths = 0
+    round_percentiles = []
+    intervals = None
+    with (nullcontext() if batch else simulation_pool(params)) as pool:
+        while True:
+            round_sketches = {name: STAT_SUMMARIES[name]() for name in STAT_FIELDS}
+            for block_first, block_sketches, block_sample in stat_blocks(params, paths, count, antithetic,
+                                                                          pool, sample_paths):
+                for name in STAT_FIELDS:
+                    round_sketches[name].merge(block_sketches[name])
+                    sample[name][block_first:block_first + len(block_sample[name])] = block_sample[name]
+            for name in STAT_FIELDS:
+                sketches[name].merge(round_sketches[name])
+            paths += count
+            print(f'Completed {paths:,} paths')
+            if tolerance is None:
+                break
+            round_percentiles.append(round_sketches[field].percentile(PERCENTILES))
+            if len(round_percentiles) >= MIN_ROUNDS:
+                intervals = percentile_intervals(round_percentiles)
+                print(f'Widest percentile interval: +/-{intervals.max():,.2f}')
+                if intervals.max() <= tolerance:
+                    break
+            if paths >= max_paths:
+                print(f'Stopped at {max_paths:,} paths before reaching +/-{tolerance:,.2f}')
+                break
+    return {**sketches, "sample": {name: values[:min(paths, sample_paths)] for name, values in sample.items()},
+            "paths": paths, "intervals": intervals}
+
+def stat_summary(sketch: QuantileSketch | IntegerHistogram) -> dict:
+    '''
+    Min, max and reported percentiles of a sketch, as plotted by create_stat_graph
+    '''
+    return {"min": sketch.min, "max": sketch.max, "percentiles": dict(zip(PERCENTILES, sketch.percentile(PERCENTILES)))}
+
+@profiled
+def run_stat_sim(params: dict, sim_count: int = 100, batch: bool = False, antithetic: bool = False,
+                 tolerance: float = None, max_paths: int = 10**6) -> dict:
+    '''
+    Generate a distribution of results from time variant samples with fixed parameters,
+    batch runs every path together in this process with the vectorized engine instead of a Pool.
+    Antithetic runs pair every path with its mirrored growth shocks to reduce variance, and a
+    tolerance keeps adding rounds of sim_count paths until the net asset percentiles converge
+    '''
     start_time = time.perf_counter()
-    with Pool() as pool:
-        results = pool.imap_unordered(multiprocess_sim, param_set)
-        for n in enumerate(results):
-            print(n[0])
-            net_assets[n[0]] = n[1][0]
-            cash_results[n[0]] = n[1][1]
+    results = stat_paths(params, sim_count, batch, antithetic, tolerance, max_paths, 'net_assets')
     end_time = time.perf_counter()
 
     # Handling results for plotting
-    x = sims
-    y = net_assets
+    x = list(range(len(results['sample']['net_assets'])))
+    y = results['sample']['net_assets']
     ytitle = "Net Assets ($)"
-    print(f"The simulation took {end_time-start_time:,.2f} seconds")
+    print(f"The simulation of {results['paths']:,} paths took {end_time-start_time:,.2f} seconds")
     print(
-        f"""Med. Cash:\t{np.median(cash_results):,.2f}
-        Med. Net Assets:\t{np.median(net_assets):,.2f}"""
+        f"""Med. Cash:\t{results['cash'].median():,.2f}
+        Med. Net Assets:\t{results['net_assets'].median():,.2f}"""
         )
-    create_stat_graph(x, y, ytitle)
+    from .visualization import create_stat_graph
+    create_stat_graph(x, y, ytitle, stat_summary(results['net_assets']), plot_path(params, "stat_net_assets"))
+    return results
 
-def run_stat_sim_retirement(params: dict, sim_count: int = 100) -> None:
+@profiled
+def run_stat_sim_retirement(params: dict, sim_count: int = 100, batch: bool = False, antithetic: bool = False,
+                            tolerance: float = None, max_paths: int = 10**6) -> dict:
     '''
-    Generate a distribution of results from time variant samples with fixed parameters
+    Generate a distribution of retirement years from time variant samples with fixed parameters,
+    with the batch, antithetic and tolerance options of run_stat_sim
     '''
-    # Set up arrays and parameters for results
-    params['use_avg_growth'] = False
-    sims = list(range(sim_count))
-    retirement_year = list(range(sim_count))
-    cash_results = list(range(sim_count))
-
-    # Prepare an array of parameters to feed into the multiprocessor
-    param_set = [params for _ in range(sim_count)]
-
-    # Multiprocessing used to run the each simulation, unordered
     start_time = time.perf_counter()
-    with Pool() as pool:
-        results = pool.imap_unordered(multiprocess_sim, param_set)
-        for n in enumerate(results):
-            print(n[0])
-            retirement_year[n[0]] = n[1][5]
-            cash_results[n[0]] = n[1][1]
+    results = stat_paths(params, sim_count, batch, antithetic, tolerance, max_paths, 'retirement_year')
     end_time = time.perf_counter()
 
     # Handling results for plotting
-    x = sims
-    y = retirement_year
-    ytitle = "Net Assets ($)"
-    print(f"The simulation took {end_time-start_time:,.2f} seconds")
+    x = list(range(len(results['sample']['retirement_year'])))
+    y = results['sample']['retirement_year']
+    ytitle = "Retirement Year"
+    print(f"The simulation of {results['paths']:,} paths took {end_time-start_time:,.2f} seconds")
     print(
-        f"""Med. Cash:\t{np.median(cash_results):,.2f}
-        Med. Net Assets:\t{np.median(retirement_year):,.2f}"""
+        f"""Med. Cash:\t{results['cash'].median():,.2f}
+        Med. Retirement Year:\t{results['retirement_year'].median():,.2f}"""
         )
-    create_stat_graph(x, y, ytitle)
+    from .visualization import create_stat_graph
+    create_stat_graph(x, y, ytitle, stat_summary(results['retirement_year']),
+                      plot_path(params, "stat_retirement_year"))
+    return results
 
+@profiled
 def run_time_sim(params: dict) -> None:
     '''
     Observe how fixed parameter settings change over time
     '''
     params['is_multi_sim'] = False
-    results = run_sim(**params)
+    results = run_sim(**{**params, 'record': 'weekly'})
     result_data = results[3]
     print(f"Passive income: {results[2]}")
     x = list(range(52 * params['years'] + 1))
@@ -393,7 +697,8 @@ def run_time_sim(params: dict) -> None:
     xtitle = "Year"
     ytitle = "Liquid Assets ($)"
     y2title = "Available Cash"
-    create_2d_time_graph(x, y, xtitle, ytitle, y2, y2title)
+    from .visualization import create_2d_time_graph
+    create_2d_time_graph(x, y, xtitle, ytitle, y2, y2title, plot_path(params, "time"))
 
 def main() -> None:
     """Main function for selecting sims"""
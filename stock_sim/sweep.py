@@ -0,0 +1,106 @@
+'''
+N-dimensional parameter sweeps over any config keys, including nested ones such as
+"promotion.salaries" or "expenses.groceries". Cells of the Cartesian product are generated
+lazily in blocks and their results streamed to an on-disk columnar store as they complete,
+so sweeps with millions of cells run in bounded memory. Read a finished sweep with load_sweep
+'''
+from itertools import islice, product
+import json
+import os
+import time
+import numpy as np
+
+from .profiling import profiled
+from .result_cache import ResultCache, format_result_cache_stats
+from .sim_engine import axis_values, root_seeded, simulation_pool, stream_cells
+from .taxes import format_cache_stats
+
+SWEEP_FORMAT = 1
+STATUS_CODES = {"completed": 0, "pruned": 1, "retired": 2}
+# Result columns of the store in multiprocess_sim order, was_negative being split in two
+RESULT_COLUMNS = (("net_assets", np.float64), ("cash", np.float64), ("div_tax", np.float64),
+                  ("cash_negative", np.bool_), ("assets_negative", np.bool_), ("min_cash", np.float64),
+                  ("retirement_year", np.int32), ("status", np.uint8))
+
+def sweep_cells(axes: list[dict]):
+    '''
+    Lazily yields the parameter changes of every cell of the axes' Cartesian product,
+    the last axis varying fastest
+    '''
+    values = [axis_values(axis) for axis in axes]
+    names = [axis['name'] for axis in axes]
+    for cell in product(*values):
+        yield dict(zip(names, cell))
+
+@profiled
+def run_sweep(params: dict, axes: list[dict], output: str, cache: ResultCache = None,
+              block_size: int = 65536) -> dict:
+    '''
+    Simulates every cell of the axes' Cartesian product over params, appending each block of
+    results to the columnar store in the output directory. Rows are written in completion order
+    with their cell number, which load_sweep turns back into axis indices.
+    Returns the sweep's metadata
+    '''
+    params = root_seeded(params)
+    values = [axis_values(axis) for axis in axes]
+    shape = [len(axis) for axis in values]
+    cells = int(np.prod(shape))
+    os.makedirs(output, exist_ok=True)
+    meta = {"format": SWEEP_FORMAT,
+            "axes": [{"name": axis['name'], "values": axis_vals} for axis, axis_vals in zip(axes, values)],
+            "shape": shape, "cells": cells, "rows": 0, "seed": params.get('seed'),
+            "columns": [["cell", "int64"]] + [[name, np.dtype(dtype).name] for name, dtype in RESULT_COLUMNS]}
+    files = {name: open(os.path.join(output, f'{name}.bin'), 'wb') for name, _ in meta['columns']}
+    cell_iter = sweep_cells(axes)
+    cache_stats = {}
+    start_time = time.perf_counter()
+    try:
+        with simulation_pool(params) as pool:
+            for first in range(0, cells, block_size):
+                block = list(islice(cell_iter, block_size))
+                columns = {"cell": np.empty(len(block), np.int64)}
+                columns.update({name: np.empty(len(block), dtype) for name, dtype in RESULT_COLUMNS})
+                for row, (idx, result) in enumerate(stream_cells(params, block, cache, pool, cache_stats)):
+                    columns["cell"][row] = first + idx
+                    columns["net_assets"][row] = result[0]
+                    columns["cash"][row] = result[1]
+                    columns["div_tax"][row] = result[2]
+                    columns["cash_negative"][row], columns["assets_negative"][row] = result[3]
+                    columns["min_cash"][row] = result[4]
+                    columns["retirement_year"][row] = result[5]
+                    columns["status"][row] = STATUS_CODES[result[6]]
+                for name, column in columns.items():
+                    column.tofile(files[name])
+                    files[name].flush()
+                meta['rows'] += len(block)
+                print(f'Completed {meta["rows"]:,}/{cells:,}')
+    finally:
+        for file in files.values():
+            file.close()
+        # The metadata records how many rows are complete, so an interrupted sweep stays readable
+        with open(os.path.join(output, f'sweep.json.{os.getpid()}.tmp'), 'w') as file:
+            json.dump(meta, file)
+        os.replace(os.path.join(output, f'sweep.json.{os.getpid()}.tmp'), os.path.join(output, 'sweep.json'))
+    end_time = time.perf_counter()
+    print(f"The sweep took {end_time-start_time:,.2f} seconds")
+    print(format_cache_stats(cache_stats))
+    if cache is not None:
+        cache.evict()
+        print(format_result_cache_stats(cache.stats()))
+    return meta
+
+def load_sweep(output: str) -> tuple[dict, dict]:
+    '''
+    Memory-maps the columns of a sweep store, adding the axis index columns of every row.
+    Returns (metadata, columns by name)
+    '''
+    with open(os.path.join(output, 'sweep.json'), 'r') as file:
+        meta = json.load(file)
+    columns = {}
+    for name, dtype in meta['columns']:
+        path = os.path.join(output, f'{name}.bin')
+        columns[name] = (np.memmap(path, dtype=dtype, mode='r', shape=(meta['rows'],))
+                         if meta['rows'] else np.empty(0, dtype))
+    for axis, indices in zip(meta['axes'], np.unravel_index(columns['cell'], meta['shape'])):
+        columns[f"{axis['name']}_index"] = indices
+    return meta, columns
@@ -0,0 +1,215 @@
+'''
+Tax tables compiled once into sorted threshold/base/rate arrays, so bracket lookups are
+binary searches that work for a single income or a whole array of them, plus a bounded
+LRU cache of tax results shared by every portfolio in the process
+'''
+from bisect import bisect_left
+from collections import OrderedDict
+import numpy as np
+
+SOCIAL_SECURITY_WAGE_BASE = 147_000
+SOCIAL_SECURITY_RATE = 0.062
+
+class TaxSchedule:
+    '''
+    Every tax type of a tax_rates table with its brackets sorted by threshold
+    '''
+    def __init__(self, tax_rates: dict, key: int = 0):
+        self.key = key # Identifies the table in the shared tax cache
+        self.tax_types = list(tax_rates)
+        self.is_dividend = ["dividend" in tax_type for tax_type in self.tax_types]
+        self.is_social_security = ["social-security" in tax_type for tax_type in self.tax_types]
+        self.rate_keys = [] # Bracket names ("15%") per type, in threshold order
+        self.thresholds = [] # Income above which each bracket applies
+        self.bases = [] # Tax owed on the income below each threshold
+        self.rates = [] # Bracket rate as a fraction
+        for brackets in tax_rates.values():
+            # The first bracket listed wins ties, and thresholds below -1 were never reachable
+            unique = {}
+            for rate_key, (threshold, base_tax) in brackets.items():
+                if threshold > -1 and threshold not in unique:
+                    unique[threshold] = (rate_key, base_tax)
+            ordered = sorted(unique)
+            self.rate_keys.append([unique[threshold][0] for threshold in ordered])
+            self.thresholds.append([float(threshold) for threshold in ordered])
+            self.bases.append([float(unique[threshold][1]) for threshold in ordered])
+            self.rates.append([float(unique[threshold][0][:-1]) / 100 for threshold in ordered])
+        self.threshold_arrays = [np.array(thresholds) for thresholds in self.thresholds]
+        self.base_arrays = [np.array(bases) for bases in self.bases]
+        self.rate_arrays = [np.array(rates) for rates in self.rates]
+
+    def calculate_tax_bracket(self, income: float) -> dict:
+        '''
+        Bracket name of every tax type that applies to a scalar income
+        '''
+        tax_bracket: dict = {}
+        for idx, tax_type in enumerate(self.tax_types):
+            bracket = bisect_left(self.thresholds[idx], income) - 1
+            if bracket >= 0:
+                tax_bracket[tax_type] = self.rate_keys[idx][bracket]
+        return tax_bracket
+
+    def taxes_owed(self, income, dividends=0) -> tuple[dict, float]:
+        '''
+        Tax owed per type and in total. Scalar incomes only report the types with an applicable
+        bracket, while array incomes or dividends report every type with 0 where none applies
+        '''
+        if not isinstance(income, np.ndarray) and not isinstance(dividends, np.ndarray):
+            return self._scalar_taxes_owed(income, dividends)
+        income = np.asarray(income, dtype=float)
+        dividends = np.asarray(dividends, dtype=float)
+        taxes_owed: dict = {}
+        total_owed = 0.0
+        for idx, tax_type in enumerate(self.tax_types):
+            if len(self.thresholds[idx]) == 0:
+                continue
+            bracket = np.searchsorted(self.threshold_arrays[idx], income, side='left') - 1
+            applies = bracket >= 0
+            bracket = np.maximum(bracket, 0)
+            rate = self.rate_arrays[idx][bracket]
+            if self.is_dividend[idx]:
+                tax_amount = rate * dividends
+            else:
+                tax_amount = (self.base_arrays[idx][bracket]
+                              + rate * (income - self.threshold_arrays[idx][bracket]))
+            if self.is_social_security[idx]:
+                tax_amount = np.where((rate == 0) & (income >= SOCIAL_SECURITY_WAGE_BASE),
+                                      SOCIAL_SECURITY_WAGE_BASE*SOCIAL_SECURITY_RATE, tax_amount)
+            taxes_owed[tax_type] = np.where(applies, tax_amount, 0.0)
+            total_owed = total_owed + taxes_owed[tax_type]
+        return taxes_owed, total_owed
+
+    def _scalar_taxes_owed(self, income: float, dividends: float) -> tuple[dict, float]:
+        '''
+        Scalar lookups bisect plain lists, which beats NumPy's per-call overhead for one income
+        '''
+        taxes_owed: dict = {}
+        total_owed: float = 0.0
+        for idx, tax_type in enumerate(self.tax_types):
+            bracket = bisect_left(self.thresholds[idx], income) - 1
+            if bracket < 0:
+                continue
+            rate = self.rates[idx][bracket]
+            if self.is_dividend[idx]:
+                tax_amount = rate * dividends
+            else:
+                tax_amount = self.bases[idx][bracket] + rate * (income - self.thresholds[idx][bracket])
+            if self.is_social_security[idx] and rate == 0 and income >= SOCIAL_SECURITY_WAGE_BASE:
+                tax_amount = SOCIAL_SECURITY_WAGE_BASE*SOCIAL_SECURITY_RATE
+            taxes_owed[tax_type] = tax_amount
+            total_owed += tax_amount
+        return taxes_owed, total_owed
+
+    def dividend_rate(self, income: float, tax_type: str = 'federal_dividend') -> float:
+        '''
+        Rate a dividend tax type charges at an income, raising KeyError when no bracket applies
+        '''
+        return self._scalar_taxes_owed(income, 1)[0][tax_type]
+
+_schedules: dict = {} # repr of a tax table -> its compiled schedule
+
+def compile_tax_rates(tax_rates: dict) -> TaxSchedule:
+    '''
+    Compiles a tax table once per process, sharing the schedule between equal tables
+    so Pool workers reuse it across the copies of the table each task carries
+    '''
+    fingerprint = repr(tax_rates)
+    if fingerprint not in _schedules:
+        _schedules[fingerprint] = TaxSchedule(tax_rates, len(_schedules))
+    return _schedules[fingerprint]
+
+TAX_CACHE_CAPACITY = 8192 # Default entries the shared tax cache holds
+TAX_CACHE_RESOLUTION = 0.01 # Default rounding of the amounts it is keyed on
+
+class TaxCache:
+    '''
+    Least recently used cache of tax results keyed on incomes and dividends rounded to a
+    resolution (0.01 for cents, 1 for dollars, 0 for exact keys). Results are computed at the
+    rounded amounts so a hit returns exactly what a miss would have
+    '''
+    def __init__(self, capacity: int = TAX_CACHE_CAPACITY, resolution: float = TAX_CACHE_RESOLUTION):
+        self.capacity = capacity
+        self.resolution = resolution
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def quantize(self, value):
+        '''
+        Rounds a scalar or array amount to the cache resolution
+        '''
+        if not self.resolution:
+            return value
+        if isinstance(value, np.ndarray):
+            return np.round(value / self.resolution) * self.resolution
+        return round(value / self.resolution) * self.resolution
+
+    def lookup(self, schedule: TaxSchedule, income: float, dividends: float, compute) -> tuple:
+        '''
+        Returns compute(income, dividends) at the rounded amounts, computing it only on a miss
+        '''
+        income = self.quantize(income)
+        dividends = self.quantize(dividends)
+        key = (schedule.key, income, dividends)
+        entries = self.entries
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+        self.misses += 1
+        result = entries[key] = compute(income, dividends)
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return result
+
+    def stats(self, reset: bool = False) -> dict:
+        '''
+        Hit, miss and eviction counts with the current size, optionally restarting the counts
+        '''
+        counts = {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                  "size": len(self.entries)}
+        if reset:
+            self.hits = self.misses = self.evictions = 0
+        return counts
+
+tax_cache = TaxCache() # Shared by every Investments in this process
+
+def configure_tax_cache(capacity: int = None, resolution: float = None) -> None:
+    '''
+    Resizes the shared tax cache or changes its key resolution, clearing it on a resolution change
+    '''
+    if resolution is not None and resolution != tax_cache.resolution:
+        tax_cache.resolution = resolution
+        tax_cache.entries.clear()
+    if capacity is not None:
+        tax_cache.capacity = capacity
+        while len(tax_cache.entries) > capacity:
+            tax_cache.entries.popitem(last=False)
+            tax_cache.evictions += 1
+
+def configure_tax_cache_for(params: dict) -> None:
+    '''
+    Sets the shared tax cache to a run's 'tax_cache_capacity' and 'tax_cache_resolution',
+    or to the defaults when they are absent so a run never inherits an earlier run's settings
+    '''
+    configure_tax_cache(params.get('tax_cache_capacity', TAX_CACHE_CAPACITY),
+                        params.get('tax_cache_resolution', TAX_CACHE_RESOLUTION))
+
+def merge_cache_stats(total: dict, stats: dict) -> dict:
+    '''
+    Adds one worker's cache counts into a running total
+    '''
+    for name, count in stats.items():
+        total[name] = total.get(name, 0) + count
+    return total
+
+def format_cache_stats(stats: dict) -> str:
+    '''
+    One line summary of cache effectiveness
+    '''
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    hit_rate = 100 * stats.get("hits", 0) / lookups if lookups else 0
+    return (f"Tax cache: {stats.get('hits', 0):,} hits, {stats.get('misses', 0):,} misses "
+            f"({hit_rate:.1f}% hit rate), {stats.get('evictions', 0):,} evictions")
@@ -1,66 +1,116 @@
-from datetime import timedelta, datetime
+from datetime import date, timedelta
 import random
-import pandas as pd
+import numpy as np
+from .price_cache import load_prices, ticker_path, week_of, weekly_returns
 
-def pull_random_range(file_path, num_years, starting_date=None):
-            # Read the CSV file into a DataFrame
-            df = pd.read_csv(file_path, parse_dates=['Date'])
-
-            # Sort by date to ensure it's ordered
-            df = df.sort_values(by='Date')
-
-            # Ensure the Date column is in datetime format
+def to_epoch_day(day) -> int:
+    '''
+    Converts a date, datetime, Timestamp or ISO string to days since 1970-01-01
+    '''
+    return int(np.datetime64(str(day)[:10], 'D').astype(np.int64))
 
-            # Get the date range from the DataFrame
-            start_date = df['Date'].min()
-            end_date = df['Date'].max()
+def pick_date(dates: np.ndarray, num_years) -> int:
+    '''
+    Picks a random start day from a sorted epoch day array that leaves room for num_years of data
+    '''
+    # Get the date range from the data
+    start_date = dates[0]
+    end_date = dates[-1]
 
-            # Calculate the maximum allowed start date to ensure a full range of num_years
-            max_start_date = end_date - timedelta(days=num_years * 400)
-
-            # Ensure we are not starting too late in the data
-            if max_start_date < start_date:
-                raise ValueError(
-                    "The dataset does not contain enough data for the specified number of years.")
-            if starting_date is None:
-                # Pick a random start date within the allowed range
-                random_start_date = start_date + \
-                    (max_start_date - start_date) * random.random()
-            else:
-                random_start_date = starting_date
-            #print(random_start_date)
-            # Calculate the end date based on the random start date
-            random_end_date = random_start_date + timedelta(days=num_years * 400)
+    # Calculate the maximum allowed start date to ensure a full range of num_years
+    max_start_date = end_date - num_years * 400
 
-            # Filter the DataFrame to the selected date range
-            mask = (df['Date'] >= random_start_date) & (df['Date'] <= random_end_date)
-            selected_data = df.loc[mask]
-            #print(random_start_date, random_end_date)
-            return list(selected_data['Close'])
+    # Ensure we are not starting too late in the data
+    if max_start_date < start_date:
+        raise ValueError(
+            "The dataset does not contain enough data for the specified number of years.")
 
-def pick_random_date(tick, num_years):
-    # Read the CSV file into a DataFrame
-    df = pd.read_csv(f'./stock_sim/database/{tick}.csv', parse_dates=['Date'])
+    # Pick a random start date within the allowed range
+    return int(start_date + (max_start_date - start_date) * random.random())
 
-    # Sort by date to ensure it's ordered
-    df = df.sort_values(by='Date')
+def window_bounds(dates: np.ndarray, start_day: int, num_years) -> tuple[int, int]:
+    '''
+    Binary searches a sorted epoch day array for the rows from start_day through num_years*400 days later
+    '''
+    return (int(np.searchsorted(dates, start_day, side='left')),
+            int(np.searchsorted(dates, start_day + num_years * 400, side='right')))
 
-    # Ensure the Date column is in datetime format
+def select_range(dates: np.ndarray, closes: np.ndarray, num_years, starting_date=None) -> np.ndarray:
+    '''
+    Closing prices from a start date (random if not given) spanning num_years,
+    as a view into the sorted closes rather than a copy
+    '''
+    if starting_date is None:
+        random_start_date = pick_date(dates, num_years)
+    elif dates[-1] - num_years * 400 < dates[0]:
+        raise ValueError(
+            "The dataset does not contain enough data for the specified number of years.")
+    else:
+        random_start_date = to_epoch_day(starting_date)
+    start, end = window_bounds(dates, random_start_date, num_years)
+    return closes[start:end]
 
-    # Get the date range from the DataFrame
-    start_date = df['Date'].min()
-    end_date = df['Date'].max()
+def pull_random_range(file_path, num_years, starting_date=None):
+    dates, closes = load_prices(file_path)
+    return select_range(dates, closes, num_years, starting_date)
 
-    # Calculate the maximum allowed start date to ensure a full range of num_years
-    max_start_date = end_date - timedelta(days=num_years * 400)
+def pick_random_date(tick, num_years, rng: np.random.Generator=None) -> date:
+    '''
+    Monday of a start week drawn uniformly from every week weekly_growth can start a
+    num_years window at
+    '''
+    first_week, growth = weekly_returns(ticker_path(tick))
+    last_start = len(growth) - num_years * 52
+    if last_start < 0:
+        raise ValueError(
+            "The dataset does not contain enough data for the specified number of years.")
+    start = rng.integers(0, last_start + 1) if rng is not None else int((last_start + 1) * random.random())
+    return date(1970, 1, 1) + timedelta(days=7 * (first_week + int(start)) - 3)
 
-    # Ensure we are not starting too late in the data
-    if max_start_date < start_date:
+def weekly_growth(tick, num_years, starting_date=None, n_paths: int=None, rng: np.random.Generator=None) -> np.ndarray:
+    '''
+    Calendar-week growth factors of a ticker for num_years*52 weeks from a start date, or from
+    random start weeks when none is given. A single path is a view shaped (weeks,), a batch of
+    n_paths is gathered with one fancy index into shape (weeks, n_paths)
+    '''
+    first_week, growth = weekly_returns(ticker_path(tick))
+    weeks = num_years * 52
+    last_start = len(growth) - weeks
+    if last_start < 0:
         raise ValueError(
             "The dataset does not contain enough data for the specified number of years.")
+    if starting_date is not None:
+        start = int(week_of(to_epoch_day(starting_date))) - first_week
+        if not 0 <= start <= last_start:
+            raise ValueError(
+                "The dataset does not contain enough data for the specified number of years.")
+        starts = np.full(n_paths or 1, start)
+    elif rng is not None:
+        starts = rng.integers(0, last_start + 1, n_paths or 1)
+    else:
+        starts = np.array([int((last_start + 1) * random.random()) for _ in range(n_paths or 1)])
+    if n_paths is None:
+        return growth[starts[0]:starts[0] + weeks]
+    return growth[starts[None, :] + np.arange(weeks)[:, None]]
 
-    # Pick a random start date within the allowed range
-    random_start_date = start_date + \
-        (max_start_date - start_date) * random.random()
-    #print(random_start_date, random_end_date)
-    return random_start_date
\ No newline at end of file
+def bootstrap_growth(ticks: list, weeks: int, block_weeks: int, rng: np.random.Generator, n_paths: int=None) -> np.ndarray:
+    '''
+    Synthetic weekly growth paths made by stitching together randomly chosen blocks of
+    block_weeks consecutive historical weeks, pooled from every ticker in ticks without a block
+    ever spanning two tickers. Shaped (weeks,) or (weeks, n_paths) like weekly_growth
+    '''
+    histories = [weekly_returns(ticker_path(tick))[1] for tick in ticks]
+    pooled = np.concatenate(histories)
+    # Block starts that keep the whole block inside one ticker's history
+    offsets = np.cumsum([0] + [len(history) for history in histories])
+    valid_starts = np.concatenate([np.arange(offset, offset + len(history) - block_weeks + 1)
+                                   for offset, history in zip(offsets, histories)])
+    if len(valid_starts) == 0:
+        raise ValueError("The dataset does not contain a full block of the requested length.")
+    n_blocks = -(-weeks // block_weeks)
+    starts = valid_starts[rng.integers(0, len(valid_starts), (n_paths or 1, n_blocks))]
+    # Gathering whole rows of a block-wide sliding window view copies each block contiguously,
+    # laid out path-major so the stitched blocks of a path are already in time order
+    blocks = np.lib.stride_tricks.sliding_window_view(pooled, block_weeks)
+    growth = blocks[starts].reshape(n_paths or 1, n_blocks * block_weeks)[:, :weeks]
+    return growth[0] if n_paths is None else growth.T
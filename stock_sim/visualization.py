@@ -1,20 +1,61 @@
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.ticker import FuncFormatter
 from matplotlib import gridspec
-from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.colors import LinearSegmentedColormap, LogNorm
 import numpy as np
 
+SCATTER_LIMIT = 20000 # Points above which a scatter is drawn as a density of binned counts
+DENSITY_BINS = (200, 100) # (x, y) bins of a density plot
+
+def new_figure(figsize: tuple, output: str = None) -> Figure:
+    '''
+    Figure rendered off screen when it is saved to an output file, with no GUI or pyplot state
+    involved, or a pyplot figure to be shown interactively otherwise
+    '''
+    if output is not None:
+        return Figure(figsize=figsize)
+    import matplotlib.pyplot as plt # Loads the GUI backend, which saved figures never need
+    return plt.figure(figsize=figsize)
+
+def finish_figure(fig: Figure, output: str = None) -> None:
+    '''
+    Saves the figure to output, whose extension picks the format (PNG through Agg, or SVG),
+    or shows it when there is no output
+    '''
+    fig.tight_layout()
+    if output is None:
+        import matplotlib.pyplot as plt
+        plt.show()
+    else:
+        fig.savefig(output)
+
+def density_counts(x: np.ndarray, y: np.ndarray, bins: tuple = DENSITY_BINS) -> tuple:
+    '''
+    Counts of points binned over the x and y ranges, the summary a density plot is drawn from.
+    Returns (x edges, y edges, counts shaped (y bins, x bins))
+    '''
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins)
+    return x_edges, y_edges, counts.T
+
+def finite_bounds(values: np.ndarray) -> list:
+    '''
+    Minimum and maximum of the plotted values, ignoring cells masked out as NaN
+    '''
+    finite = values[np.isfinite(values)]
+    return [finite.min(), finite.max()] if finite.size else [0, 0]
+
 def create_3d_graph(x: list, y: list, z: list, xtitle: str, ytitle: str, ztitle: str, z2: list=None, z2title: str="",
-                    tax_ratio: bool=False, check_negative: bool=False) -> None:
+                    tax_ratio: bool=False, check_negative: bool=False, output: str=None) -> None:
     '''
-    Creates a heatmap of liquid assets and cash on hand from the results of a 2-variable simulation
+    Creates a heatmap of liquid assets and cash on hand from the results of a 2-variable simulation,
+    saved to the output file when one is given
     '''
     if z2 is None:
         z2 = []
-    fig = plt.figure(figsize = (20,10))
+    fig = new_figure((20,10), output)
     gs = gridspec.GridSpec(1, 2, width_ratios=[1, 1])
-    ax1 = plt.subplot(gs[0])
-    ax2 = plt.subplot(gs[1])
+    ax1 = fig.add_subplot(gs[0])
+    ax2 = fig.add_subplot(gs[1])
 
     def millions_formatter(x: float, pos) -> str:
         """Formats axis labels to k or M if the numbers are large enough"""
@@ -45,8 +86,8 @@ def create_3d_graph(x: list, y: list, z: list, xtitle: str, ytitle: str, ztitle:
     Z = np.array(z)
     Z2 = np.array(z2)
 
-    mesh = ax1.pcolormesh(X, Y, Z, shading='auto', cmap = plt.cm.gist_ncar_r)
-    mesh2 = ax2.pcolormesh(X, Y, Z2, shading='auto', cmap = plt.cm.gist_ncar_r) if not tax_ratio\
+    mesh = ax1.pcolormesh(X, Y, Z, shading='auto', cmap = 'gist_ncar_r')
+    mesh2 = ax2.pcolormesh(X, Y, Z2, shading='auto', cmap = 'gist_ncar_r') if not tax_ratio\
             else ax2.pcolormesh(X, Y, Z2, shading='auto',
                             cmap = LinearSegmentedColormap.from_list('rg',
                             ["white", "darkred", "gold", "g", "aquamarine", "darkblue"], N=256))
@@ -61,7 +102,7 @@ def create_3d_graph(x: list, y: list, z: list, xtitle: str, ytitle: str, ztitle:
     ax2.yaxis.set_major_formatter(FuncFormatter(millions_formatter))
 
     # Liquid Assets labels
-    Z1bounds = [int(min(Z.flatten())),int(max(Z.flatten()))]
+    Z1bounds = [int(bound) for bound in finite_bounds(Z)]
     Z1Diff = Z1bounds[1]-Z1bounds[0]
     #print(Z1bounds, Z1Diff)
     cbar = fig.colorbar(mesh, ticks=list(range(Z1bounds[0],Z1bounds[1],Z1Diff//20 or 1)))
@@ -71,7 +112,7 @@ def create_3d_graph(x: list, y: list, z: list, xtitle: str, ytitle: str, ztitle:
     # Resulting Cash/tax ratio Labels
     tax_ratio_vals = [-0.1, 0, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 1]
 
-    Z2bounds = [min(Z2.flatten()),max(Z2.flatten())]
+    Z2bounds = finite_bounds(Z2)
     Z2Diff = Z2bounds[1]-Z2bounds[0]
     #print(Z2bounds, Z2Diff, int(Z2bounds[0]*100), int(Z2bounds[1]*100+1))
     cbar2 = fig.colorbar(mesh2, ticks=tax_ratio_vals if tax_ratio\
@@ -81,14 +122,16 @@ def create_3d_graph(x: list, y: list, z: list, xtitle: str, ytitle: str, ztitle:
     cbar.update_ticks()
 
     # Plot displays
-    plt.tight_layout()
-    plt.show()
+    finish_figure(fig, output)
 
-def create_stat_graph(x: list, y: list, ytitle: str) -> None:
+def create_stat_graph(x: list, y: list, ytitle: str, summary: dict = None, output: str = None) -> None:
     '''
-    Creates a box-and-whisker plot/scatter plot from statistical simulation to show %ile ranges
+    Creates a box-and-whisker plot/scatter plot from statistical simulation to show %ile ranges.
+    The ranges come from the summary's min, max and percentiles when given, as for streamed runs
+    whose scatter only holds a sample of the paths, and from y otherwise. Past SCATTER_LIMIT
+    points the scatter becomes a density plot of binned counts
     '''
-    fig = plt.figure(figsize = (20,6))
+    fig = new_figure((20,6), output)
 
     def millions_formatter_text(x: float) -> str:
         """Formats axis labels to k or M if the numbers are large enough"""
@@ -111,14 +154,17 @@ def create_stat_graph(x: list, y: list, ytitle: str) -> None:
         return f"{x * 1e-6:.2f}M"
 
     gs = gridspec.GridSpec(1, 2, width_ratios=[1, 4])
-    ax1 = plt.subplot(gs[0])
-    med = np.median(y)
-    miny=np.min(y)
-    maxy=np.max(y)
-    percentile_25 = np.percentile(y, 25)
-    percentile_75 = np.percentile(y, 75)
-    percentile_5 = np.percentile(y, 5)
-    percentile_95 = np.percentile(y, 95)
+    ax1 = fig.add_subplot(gs[0])
+    if summary is None:
+        summary = {"min": np.min(y), "max": np.max(y),
+                   "percentiles": dict(zip((5, 25, 50, 75, 95), np.percentile(y, (5, 25, 50, 75, 95))))}
+    med = summary["percentiles"][50]
+    miny = summary["min"]
+    maxy = summary["max"]
+    percentile_25 = summary["percentiles"][25]
+    percentile_75 = summary["percentiles"][75]
+    percentile_5 = summary["percentiles"][5]
+    percentile_95 = summary["percentiles"][95]
     errIQR = [[med-percentile_25], [percentile_75-med]]
     err90 = [[med-percentile_5], [percentile_95-med]]
 
@@ -146,8 +192,12 @@ def create_stat_graph(x: list, y: list, ytitle: str) -> None:
     handles, labels = ax1.get_legend_handles_labels()
     ax1.legend(handles, labels)
 
-    ax2 = plt.subplot(gs[1])
-    ax2.scatter(x,y,marker='.',s=10)
+    ax2 = fig.add_subplot(gs[1])
+    if len(y) > SCATTER_LIMIT:
+        x_edges, y_edges, counts = density_counts(np.asarray(x), np.asarray(y))
+        ax2.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts, 0), cmap='viridis', norm=LogNorm())
+    else:
+        ax2.scatter(x,y,marker='.',s=10)
     # ax2.set_ylabel("Result Assets ($)")
     ax2.set_yticks([])
     ax2.set_xlabel("Simulation Result # ")
@@ -156,14 +206,14 @@ def create_stat_graph(x: list, y: list, ytitle: str) -> None:
 
     ax1.grid(color='grey', linestyle='-', linewidth=0.5)
     ax2.grid(color='grey', linestyle='-', linewidth=0.5)
-    plt.tight_layout()
-    plt.show()
+    finish_figure(fig, output)
 
-def create_2d_time_graph(x: list, y: list, xtitle: str, ytitle: str, y2: list, y2title: str) -> None:
+def create_2d_time_graph(x: list, y: list, xtitle: str, ytitle: str, y2: list, y2title: str, output: str = None) -> None:
     '''
-    Line graph of liquid assets and cash vs time with resolution of a week from the time simulation
+    Line graph of liquid assets and cash vs time with resolution of a week from the time simulation,
+    saved to the output file when one is given
     '''
-    fig = plt.figure(figsize = (20,6))
+    fig = new_figure((20,6), output)
 
     def millions_formatter_text(x: float) -> str:
         """Formats axis labels to k or M if the numbers are large enough"""
@@ -190,7 +240,7 @@ def create_2d_time_graph(x: list, y: list, xtitle: str, ytitle: str, y2: list, y
         return f"{x // 52}"
 
     gs = gridspec.GridSpec(1, 2, width_ratios=[1, 1])
-    ax1 = plt.subplot(gs[0])
+    ax1 = fig.add_subplot(gs[0])
     ax1.plot(x, y, color='black')
     ax1.set_ylabel(f"{ytitle}", labelpad=20)
     ax1.set_xlabel(f"{xtitle}", labelpad= 20)
@@ -200,7 +250,7 @@ def create_2d_time_graph(x: list, y: list, xtitle: str, ytitle: str, y2: list, y
     handles, labels = ax1.get_legend_handles_labels()
     ax1.legend(handles, labels)
 
-    ax2 = plt.subplot(gs[1])
+    ax2 = fig.add_subplot(gs[1])
     ax2.plot(x,y2, color='black')
     ax2.set_ylabel(f"{y2title}")
     ax2.set_xlabel(f"{xtitle}", labelpad=20)
@@ -210,5 +260,4 @@ def create_2d_time_graph(x: list, y: list, xtitle: str, ytitle: str, y2: list, y
 
     ax1.grid(color='grey', linestyle='-', linewidth=0.5)
     ax2.grid(color='grey', linestyle='-', linewidth=0.5)
-    plt.tight_layout()
-    plt.show()
+    finish_figure(fig, output)
@@ -0,0 +1,59 @@
+import pytest
+import numpy as np
+from stock_sim.batch_engine import run_batch_sim
+from stock_sim.sim_engine import multiprocess_sim
+
+@pytest.mark.parametrize("strategy", ["Basic", "NWFraction", "SafeNWCashFraction", "CashRatioCeiling"])
+def test_batch_matches_multiprocess_sim(config_parameters, strategy):
+    """Every path of a deterministic batch should match the scalar engine exactly."""
+    config_parameters["strategy"] = strategy
+    expected = multiprocess_sim(dict(config_parameters))
+    results = run_batch_sim(dict(config_parameters), 3)
+    for path in range(3):
+        assert results['net_assets'][path] == expected[0]
+        assert results['cash'][path] == expected[1]
+        assert results['div_tax'][path] == expected[2]
+        assert list(results['was_negative'][path]) == expected[3]
+        assert results['min_cash'][path] == expected[4]
+        assert results['retirement_year'][path] == expected[5]
+
+def test_batch_annualized_taxes(config_parameters):
+    """Annualized taxes are subtracted per path like the scalar engine."""
+    config_parameters["annualized_taxes"] = True
+    expected = multiprocess_sim(dict(config_parameters))
+    results = run_batch_sim(dict(config_parameters), 2)
+    assert results['net_assets'][1] == expected[0]
+    assert results['div_tax'][1] == expected[2]
+
+def test_batch_stochastic_paths(config_parameters):
+    """Stochastic batches are chunked, seeded and produce independent paths."""
+    config_parameters["use_avg_growth"] = False
+    results = run_batch_sim(config_parameters, 50, chunk_size=16, seed=1)
+    assert results['net_assets'].shape == (50,)
+    assert results['was_negative'].shape == (50, 2)
+    assert len(np.unique(results['net_assets'])) == 50
+    repeat = run_batch_sim(config_parameters, 50, chunk_size=16, seed=1)
+    assert np.array_equal(results['net_assets'], repeat['net_assets'])
+
+def test_batch_antithetic_pairs(config_parameters):
+    """Antithetic batches interleave each drawn path with its mirrored twin."""
+    config_parameters.update({"use_avg_growth": False, "std_dev": 0.15, "antithetic": True})
+    results = run_batch_sim(config_parameters, 65, chunk_size=33, seed=2)
+    assert results['net_assets'].shape == (65,)
+    net = results['net_assets'][:64]
+    assert np.corrcoef(net[0::2], net[1::2])[0, 1] < 0
+
+def test_batch_backtest_matches_multiprocess_sim(config_parameters):
+    """A fixed-date backtest follows the same calendar weeks in both engines."""
+    config_parameters.update({"backtest": True, "start_date": "1970-06-01"})
+    expected = multiprocess_sim(dict(config_parameters))
+    results = run_batch_sim(dict(config_parameters), 2)
+    assert results['net_assets'][0] == expected[0]
+    assert results['retirement_year'][1] == expected[5]
+
+def test_batch_bootstrap_paths(config_parameters):
+    """Block-bootstrapped returns drive each path through the batch engine."""
+    config_parameters.update({"bootstrap": True, "bootstrap_block_weeks": 13})
+    results = run_batch_sim(config_parameters, 20, seed=3)
+    assert results['net_assets'].shape == (20,)
+    assert len(np.unique(results['net_assets'])) > 1
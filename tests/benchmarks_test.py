@@ -0,0 +1,30 @@
+import json
+from stock_sim.benchmarks import BENCHMARKS, compare, main, run_benchmarks
+
+def test_benchmarks_cover_the_engine():
+    """Test that every benchmarked entry point is registered."""
+    assert set(BENCHMARKS) == {"run_sim_deterministic", "run_sim_stochastic", "run_sim_backtest",
+                               "calculate_taxes_owed", "pull_random_range", "run_2v_sims", "run_stat_sim"}
+
+def test_compare_flags_slowdowns_past_threshold():
+    """Test that only benchmarks slower than the threshold allows are regressions."""
+    baseline = {"a": 1.0, "b": 1.0, "c": 1.0}
+    results = {"a": 1.1, "b": 1.3, "c": 0.5, "new": 9.0}
+    assert compare(results, baseline, 0.25) == [("b", 1.0, 1.3)]
+
+def test_save_then_compare(tmp_path):
+    """Test that a saved baseline passes its own comparison and a much faster one fails it."""
+    baseline = tmp_path / "baseline.json"
+    names = ["calculate_taxes_owed", "pull_random_range"]
+    assert main(["--save", "--baseline", str(baseline), "--repeat", "1"] + names) == 0
+    saved = json.loads(baseline.read_text())
+    assert set(saved["results"]) == set(names)
+    assert main(["--compare", "--baseline", str(baseline), "--repeat", "1", "--threshold", "10"] + names) == 0
+    saved["results"] = {name: seconds / 100 for name, seconds in saved["results"].items()}
+    baseline.write_text(json.dumps(saved))
+    assert main(["--compare", "--baseline", str(baseline), "--repeat", "1"] + names) == 1
+
+def test_run_sim_benchmarks_time_each_variant():
+    """Test that the run_sim benchmarks run and time a single path."""
+    results = run_benchmarks(["run_sim_deterministic", "run_sim_backtest"], repeat=1)
+    assert all(seconds > 0 for seconds in results.values())
@@ -0,0 +1,11 @@
+import json
+import pytest
+from stock_sim.finance import tax_rates
+
+@pytest.fixture
+def config_parameters():
+    """Fixture to load the test config with its tax table resolved."""
+    with open("./stock_sim/database/configs/test_config.json", 'r') as file:
+        params = json.load(file)
+    params['taxes'] = tax_rates[params['taxes']]
+    return params
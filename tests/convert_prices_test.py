@@ -0,0 +1,12 @@
+import subprocess
+import sys
+
+def test_convert_prices_script(tmp_path):
+    """Test that the converter script converts a directory's CSVs without importing itself twice."""
+    (tmp_path / "TEST.csv").write_text("Date,Close\n2020-01-02 00:00:00-05:00,1.0\n"
+                                       "2020-01-03 00:00:00-05:00,2.0\n")
+    run = subprocess.run([sys.executable, "-W", "error::RuntimeWarning", "-m", "stock_sim.convert_prices",
+                          str(tmp_path)], capture_output=True, text=True, check=True)
+    assert run.stdout == "Converted TEST.csv\n"
+    assert run.stderr == ""
+    assert (tmp_path / "binary").is_dir()
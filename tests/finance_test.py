@@ -1,5 +1,6 @@
 import pytest
-from stock_sim.finance import Investments
+import numpy as np
+from stock_sim.finance import Investments, growth_factors
 
 @pytest.fixture
 def sample_investment():
@@ -43,3 +44,53 @@ def test_negative_investment_strategy(sample_investment):
     with pytest.raises(ValueError):
         sample_investment.calculate_taxes_owed(-1000)  # Negative income
 
+
+def test_growth_buffer_is_seeded():
+    """Test that growth factors for every week are drawn up front from the seed."""
+    kwargs = dict(value=1000, income=80000, market_growth=1.07, dividend_growth=0.02,
+                  expenses={}, tax_rates={}, std_dev=0.15, years=2, seed=42)
+    first, second = Investments(**kwargs), Investments(**kwargs)
+    assert len(first.growth_buffer) == 104
+    assert first.growth_buffer == second.growth_buffer
+    first.compound_stocks(1.07, 0, std_dev=0.15)
+    assert first.assets["stocks"] == pytest.approx(1000 * first.growth_buffer[0])
+    assert first.growth_idx == 1
+
+def test_growth_buffer_average_growth():
+    """Test that the deterministic model fills the buffer with the average weekly growth."""
+    investment = Investments(1000, 80000, 1.07, 0.02, {}, {}, years=1)
+    assert investment.growth_buffer == [1 + 0.07 / 52] * 52
+
+def test_retirement_threshold_matches_passive_income(sample_investment):
+    """Test that passive income reaches the goal right at the precomputed stock value."""
+    goal = 40000
+    threshold = sample_investment.retirement_threshold(0.05, goal)
+    sample_investment.assets["stocks"] = threshold
+    assert sample_investment.calculate_passive_income(0.05) == pytest.approx(goal)
+    sample_investment.assets["stocks"] = threshold * 0.99
+    assert sample_investment.calculate_passive_income(0.05) < goal
+
+def test_assets_view_tracks_attributes(sample_investment):
+    """Test that the assets mapping reads and writes the float attributes."""
+    sample_investment.cash = 250.0
+    assert dict(sample_investment.assets) == {"cash": 250.0, "stocks": 100000, "bonds": 0}
+    sample_investment.assets["bonds"] = 10.0
+    assert sample_investment.bonds == 10.0
+    with pytest.raises(KeyError):
+        sample_investment.assets["gold"] = 1.0
+    with pytest.raises(AttributeError):
+        sample_investment.unknown = 1
+
+def test_strategy_function_matches_run_investment_strategy(sample_investment):
+    """Test that the pre-resolved strategy invests what the named strategy does."""
+    sample_investment.cash = 90000.0
+    invest_amount = sample_investment.strategy_function("SafeNWCashFraction", 0.5, 0.05, 75000)
+    assert invest_amount(2000) == 0.5*90000 + 0.5*2000
+    assert sample_investment.strategy_function("NoInvest")(2000) == 0
+
+def test_antithetic_growth_factors_mirror_shocks():
+    """Test that antithetic factors mirror the same draws around the mean weekly growth."""
+    drawn = growth_factors(1.07, 0.15, 520, np.random.default_rng(4))
+    mirrored = growth_factors(1.07, 0.15, 520, np.random.default_rng(4), antithetic=True)
+    assert np.allclose(drawn + mirrored, 2 * (1 + 0.07 / 52))
+    assert not np.allclose(drawn, mirrored)
@@ -0,0 +1,25 @@
+import subprocess
+import sys
+
+IMPORT_BUDGET = 0.6 # Seconds `import stock_sim` may take in a fresh interpreter, about 3x the measured time
+
+def run_python(code: str) -> str:
+    """Runs code in a fresh interpreter so no module is already imported."""
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+
+def test_import_time_budget():
+    """Test that importing the package stays within its import-time budget."""
+    code = ("import time\nstart = time.perf_counter()\nimport stock_sim\n"
+            "print(time.perf_counter() - start)")
+    assert min(float(run_python(code)) for _ in range(3)) < IMPORT_BUDGET
+
+def test_workers_skip_plotting_and_pandas():
+    """Test that simulating, as Pool workers do, never imports matplotlib or pandas."""
+    code = ("import json, sys\nfrom stock_sim.sim_engine import multiprocess_sim\n"
+            "from stock_sim.finance import tax_rates\n"
+            "params = json.load(open('./stock_sim/database/configs/test_config.json'))\n"
+            "params['taxes'] = tax_rates[params['taxes']]\n"
+            "multiprocess_sim(dict(params, use_avg_growth=False, seed=1))\n"
+            "multiprocess_sim(dict(params, backtest=True, start_date='random', seed=1))\n"
+            "print(sorted({'matplotlib', 'pandas'} & set(sys.modules)))")
+    assert run_python(code).strip() == "[]"
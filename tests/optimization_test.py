@@ -1,5 +1,6 @@
 import pytest
-from stock_sim.optimization import find_best_2v
+from stock_sim.optimization import adaptive_search_2v, coarse_stride, find_best_2v, is_feasible
+from stock_sim.sim_engine import axis_values, run_cells
 
 def test_optimization_results():
     """Test that optimization returns valid results."""
@@ -16,3 +17,33 @@ def test_optimization_results():
     # assert len(top_results) <= 10  # Ensure no more than 10 results
     # for result in top_results:
     #     assert result["Retirement Year"] != -1  # Check valid retirement years
+
+def test_coarse_stride():
+    """Test that the coarse step is the largest power of two keeping enough points."""
+    assert coarse_stride(50, 5) == 8
+    assert coarse_stride(18, 5) == 4
+    assert coarse_stride(3, 5) == 1
+
+def test_adaptive_search_finds_full_grid_best(config_parameters):
+    """Test that the coarse-to-fine search ranks the same best cells as the full grid."""
+    params = dict(config_parameters, use_avg_growth=True)
+    v1 = {"min": 0.01, "max": 1, "increment": 0.04, "name": "invest_factor"}
+    v2 = {"min": 65000, "max": 150000, "increment": 10000, "name": "income"}
+    xs, ys = axis_values(v1), axis_values(v2)
+    cells = [(x_idx, y_idx) for x_idx in range(len(xs)) for y_idx in range(len(ys))]
+    full = dict(zip(cells, run_cells(params, [{v1['name']: xs[x], v2['name']: ys[y]} for x, y in cells])))
+    evaluated = adaptive_search_2v(dict(params), v1, v2)
+    assert len(evaluated) < len(full)
+
+    def top(results):
+        feasible = [cell for cell, result in results.items() if is_feasible(result, 10000)]
+        return sorted(feasible, key=lambda cell: (results[cell][5], -results[cell][0]))[:5]
+    assert top(full) and top(evaluated) == top(full)
+
+def test_adaptive_search_shares_random_backtest_paths(config_parameters):
+    """Test that identical cells of a random-start backtest search see the same market path."""
+    params = dict(config_parameters, backtest=True, start_date="random", years=10)
+    evaluated = adaptive_search_2v(params, {"values": [0.5] * 3, "name": "invest_factor"},
+                                   {"values": [100000] * 2, "name": "income"})
+    assert len(evaluated) == 6
+    assert len({result[0] for result in evaluated.values()}) == 1
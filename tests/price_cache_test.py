@@ -0,0 +1,51 @@
+import numpy as np
+from stock_sim import price_cache
+from stock_sim.price_cache import get_prices, shared_prices, attach_prices, clear_cache
+
+def test_prices_are_parsed_once():
+    """Test that repeated lookups return the cached arrays."""
+    dates, closes = get_prices("AAPL")
+    assert dates.dtype == np.int64 and closes.dtype == np.float64
+    assert np.all(np.diff(dates) > 0)
+    assert get_prices("AAPL")[0] is dates
+
+def test_shared_prices_attach():
+    """Test that a worker attaching the shared handles sees the parent's arrays."""
+    dates, closes = get_prices("VOO")
+    with shared_prices(["VOO"]) as handles:
+        clear_cache()
+        attach_prices(handles)
+        shared_dates, shared_closes = get_prices("VOO")
+        assert np.array_equal(shared_dates, dates)
+        assert np.array_equal(shared_closes, closes)
+        clear_cache()
+    price_cache._attached.clear()
+
+def test_binary_store_refreshes_when_stale(tmp_path):
+    """Test that the binary store is read when current and rebuilt when the CSV changes."""
+    csv = tmp_path / "TEST.csv"
+    csv.write_text("Date,Close\n2020-01-03 00:00:00-05:00,2.0\n2020-01-02 00:00:00-05:00,1.0\n")
+    dates, closes = price_cache.load_prices(str(csv))
+    assert list(closes) == [1.0, 2.0]
+    assert price_cache.read_binary(str(csv)) is not None
+
+    csv.write_text("Date,Close\n2020-01-02 00:00:00-05:00,1.0\n2020-01-03 00:00:00-05:00,3.0\n"
+                   "2020-01-06 00:00:00-05:00,4.0\n")
+    assert price_cache.read_binary(str(csv)) is None
+    clear_cache()
+    dates, closes = price_cache.load_prices(str(csv))
+    assert list(closes) == [1.0, 3.0, 4.0]
+    assert list(dates - dates[0]) == [0, 1, 4]
+    clear_cache()
+
+def test_weekly_returns_follow_calendar_weeks(tmp_path):
+    """Test that weekly growth uses each week's last close and fills weeks without trading."""
+    csv = tmp_path / "WEEKS.csv"
+    # Thu/Fri of one week, a holiday-short week, a closed week, then one more week
+    csv.write_text("Date,Close\n2020-01-02 00:00:00-05:00,1.0\n2020-01-03 00:00:00-05:00,2.0\n"
+                   "2020-01-06 00:00:00-05:00,3.0\n2020-01-08 00:00:00-05:00,4.0\n"
+                   "2020-01-21 00:00:00-05:00,6.0\n")
+    first_week, growth = price_cache.weekly_returns(str(csv))
+    assert first_week == price_cache.week_of(np.datetime64('2020-01-02', 'D').astype(np.int64))
+    assert list(growth) == [2.0, 1.0, 1.5]
+    clear_cache()
@@ -0,0 +1,30 @@
+import pstats
+from stock_sim.profiling import profile_directory
+from stock_sim.sim_engine import run_stat_sim, run_time_sim
+
+def call_counts(path: str) -> dict:
+    """Calls of every profiled function by name."""
+    counts = {}
+    for (_, _, name), stat in pstats.Stats(str(path)).stats.items():
+        counts[name] = counts.get(name, 0) + stat[1]
+    return counts
+
+def test_profiled_run_merges_worker_stats(config_parameters, tmp_path, capsys):
+    """Test that a profiled Pool run merges the workers' profiles with the parent's."""
+    output = tmp_path / "run.prof"
+    params = dict(config_parameters, seed=1, profile=True, profile_output=str(output), profile_top=5,
+                  plot_output=str(tmp_path))
+    run_stat_sim(params, 8)
+    counts = call_counts(output)
+    # Paths only run in the workers and the stat sim only in the parent
+    assert counts["run_sim"] == 8 and counts["stat_paths"] == 1
+    assert "Ordered by: internal time" in capsys.readouterr().out
+    assert profile_directory() is None
+
+def test_runs_without_the_switch_are_not_profiled(config_parameters, tmp_path, monkeypatch):
+    """Test that profiling is opt-in, and that runs without a pool are profiled in the parent."""
+    monkeypatch.chdir(tmp_path)
+    run_time_sim(dict(config_parameters, plot_output=str(tmp_path)))
+    assert not (tmp_path / "profile.prof").exists()
+    run_time_sim(dict(config_parameters, plot_output=str(tmp_path), profile=True))
+    assert call_counts(tmp_path / "profile.prof")["run_sim"] == 1
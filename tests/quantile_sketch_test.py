@@ -0,0 +1,49 @@
+import numpy as np
+from stock_sim.quantile_sketch import IntegerHistogram, QuantileSketch
+
+def test_sketch_matches_exact_percentiles():
+    """Test that a streamed sketch stays close to the exact percentiles in bounded memory."""
+    values = np.exp(np.random.default_rng(0).normal(14, 0.8, 200000))
+    sketch = QuantileSketch()
+    for chunk in np.array_split(values, 50):
+        sketch.add(chunk)
+    percentiles = [1, 5, 25, 50, 75, 95, 99]
+    exact = np.percentile(values, percentiles)
+    assert np.allclose(sketch.percentile(percentiles), exact, rtol=1e-3)
+    assert sketch.min == values.min() and sketch.max == values.max() and sketch.count == values.size
+    assert len(sketch.means) <= sketch.compression
+
+def test_merged_sketches_match_one_sketch():
+    """Test that merging per-worker sketches summarizes the same values as one sketch."""
+    values = np.random.default_rng(1).normal(0, 1, 100000)
+    whole = QuantileSketch()
+    whole.add(values)
+    merged = QuantileSketch()
+    for part in np.array_split(values, 7):
+        partial = QuantileSketch()
+        partial.add(part)
+        merged.merge(partial)
+    merged.merge(QuantileSketch())
+    assert merged.count == whole.count
+    assert np.allclose(merged.quantile([0.05, 0.5, 0.95]), whole.quantile([0.05, 0.5, 0.95]), atol=0.01)
+
+def test_empty_and_constant_sketches():
+    """Test the quantiles of a sketch without values or with a single repeated value."""
+    assert np.isnan(QuantileSketch().median())
+    sketch = QuantileSketch()
+    sketch.add(np.full(1000, 7.0))
+    assert sketch.median() == 7.0 and sketch.percentile(95) == 7.0
+
+def test_integer_histogram_is_exact_on_discrete_data():
+    """Test that merged integer histograms reproduce np.percentile exactly, never retiring included."""
+    rng = np.random.default_rng(2)
+    for values in (rng.integers(5, 25, 1001), rng.integers(-1, 41, 5000), np.array([-1, -1, 30])):
+        merged = IntegerHistogram()
+        for part in np.array_split(values, 6):
+            partial = IntegerHistogram()
+            partial.add(part)
+            merged.merge(partial)
+        percentiles = [0, 5, 25, 50, 75, 95, 100]
+        assert np.array_equal(merged.percentile(percentiles), np.percentile(values, percentiles))
+        assert merged.count == values.size and merged.min == values.min() and merged.max == values.max()
+    assert np.isnan(IntegerHistogram().median())
@@ -0,0 +1,43 @@
+import os
+from stock_sim.result_cache import ResultCache, params_key, reproducible
+
+def sample_params(**changes):
+    """Minimal resolved parameters for cache keys."""
+    params = {"backtest": False, "start_date": "random", "use_avg_growth": True,
+              "income": 100000, "taxes": {"federal_income": {"10%": [0, 0]}}}
+    params.update(changes)
+    return params
+
+def test_key_ignores_order_and_display_options():
+    """Test that keys only depend on the parameters that change a result."""
+    params = sample_params()
+    reordered = dict(reversed(list(params.items())), record="weekly")
+    assert params_key(params) == params_key(reordered)
+    assert params_key(params) != params_key(sample_params(income=100001))
+
+def test_only_reproducible_params_are_cached(tmp_path):
+    """Test that unseeded random backtests and stochastic runs bypass the cache."""
+    cache = ResultCache(str(tmp_path))
+    assert not reproducible(sample_params(backtest=True))
+    assert reproducible(sample_params(backtest=True, seed=3))
+    assert not reproducible(sample_params(use_avg_growth=False))
+    assert reproducible(sample_params(use_avg_growth=False, seed=3))
+    cache.put(sample_params(backtest=True), (1.0,))
+    assert cache.get(sample_params(backtest=True)) is None
+    assert cache.stats()["writes"] == 0
+
+def test_round_trip_and_eviction(tmp_path):
+    """Test that results come back exactly and the oldest entries are evicted first."""
+    cache = ResultCache(str(tmp_path))
+    result = (1234567.891, 0.1, 2.5, [False, True], -3.75, 12)
+    for income in range(3):
+        cache.put(sample_params(income=income), result)
+        path = cache.path(params_key(sample_params(income=income)))
+        os.utime(path, (1000 + income, 1000 + income))
+    assert cache.get(sample_params(income=0)) == result
+    assert cache.get(sample_params(income=9)) is None
+    cache.max_bytes = os.path.getsize(path)
+    cache.evict()
+    assert cache.stats() == {"hits": 1, "misses": 1, "writes": 3, "evictions": 2}
+    assert cache.get(sample_params(income=0)) == result
+    assert cache.get(sample_params(income=1)) is None
@@ -1,5 +1,11 @@
+import multiprocessing
 import pytest
-from stock_sim.sim_engine import run_sim, run_2v_sims
+import numpy as np
+from stock_sim.sim_engine import run_sim, run_2v_sims, multiprocess_sim, indexed_multiprocess_sim, pool_chunksize, \
+    init_worker, task_seeds, root_seeded, run_cells, run_stat_sim, run_stat_sim_retirement, stat_paths, \
+    percentile_intervals, plot_path, PERCENTILES
+from stock_sim.taxes import tax_cache
+from stock_sim import sim_engine, visualization
 
 @pytest.fixture
 def simulation_parameters():
@@ -43,3 +49,169 @@ def test_run_2v_sims(simulation_parameters):
     # results = run_2v_sims(simulation_parameters, dimX, dimY)
     # assert "Net" in results  # Ensure the key results are present
     # assert len(results["Net"]) > 0  # Check that results are populated
+
+def test_run_sim_bootstrap(config_parameters):
+    """Test that the bootstrap mode is reproducible from a seed."""
+    params = dict(config_parameters, bootstrap=True, seed=7)
+    assert multiprocess_sim(dict(params)) == multiprocess_sim(dict(params))
+
+def test_run_sim_random_backtest_start(config_parameters):
+    """Test that random backtest start weeks come from the seed and cover the whole history."""
+    params = dict(config_parameters, backtest=True, start_date="random", years=10)
+    assert multiprocess_sim(dict(params, seed=7)) == multiprocess_sim(dict(params, seed=7))
+    results = {multiprocess_sim(dict(params, seed=seed))[0] for seed in range(4)}
+    assert len(results) > 1
+
+@pytest.mark.parametrize("record, points", [("none", 1), ("yearly", 11), ("monthly", 121), ("weekly", 521)])
+def test_run_sim_recording_resolution(record, points, config_parameters):
+    """Test that series are stored at the requested resolution without changing the results."""
+    params = dict(config_parameters, years=10)
+    weekly = run_sim(**dict(params, record="weekly"))
+    results = run_sim(**dict(params, record=record))
+    assets_over_time, cash_over_time = results[3]
+    assert len(assets_over_time) == len(cash_over_time) == points
+    assert assets_over_time[-1] == weekly[3][0][-1] or record == "none"
+    assert results[1] == weekly[1] and results[5:] == weekly[5:]
+
+def test_run_sim_unknown_recording_resolution(config_parameters):
+    """Test that an unknown recording resolution is rejected."""
+    params = dict(config_parameters, record="daily")
+    with pytest.raises(ValueError):
+        run_sim(**params)
+
+def test_indexed_multiprocess_sim_tags_results(config_parameters):
+    """Test that grid cell results carry their index and match multiprocess_sim."""
+    params = config_parameters
+    index, result, stats = indexed_multiprocess_sim(((3, 4), dict(params)))
+    assert index == (3, 4)
+    assert result == multiprocess_sim(dict(params))
+    assert stats["hits"] + stats["misses"] > 0
+
+def test_pool_chunksize():
+    """Test that chunks give each worker about four chunks of the grid."""
+    assert pool_chunksize(900, 4) == 57
+    assert pool_chunksize(3, 8) == 1
+
+def test_tasks_carry_changes_to_installed_base(config_parameters):
+    """Test that a worker's installed base parameters are updated with each task's changes."""
+    params = config_parameters
+    init_worker({}, params)
+    try:
+        _, result, _ = indexed_multiprocess_sim((0, {"invest_factor": 0.5, "income": 90000}))
+        assert result == multiprocess_sim(dict(params, invest_factor=0.5, income=90000))
+    finally:
+        init_worker({}, {})
+
+def test_workers_honour_tax_cache_params(config_parameters):
+    """Test that a spawned worker keys its tax cache on the run's resolution and capacity."""
+    params = dict(config_parameters, tax_cache_resolution=1000, tax_cache_capacity=16)
+    coarse = multiprocess_sim(dict(params))
+    assert coarse != multiprocess_sim(dict(config_parameters))
+    assert (tax_cache.resolution, tax_cache.capacity) == (0.01, 8192)
+    with multiprocessing.get_context("spawn").Pool(1, initializer=init_worker, initargs=({}, params)) as pool:
+        _, result, stats = pool.apply(indexed_multiprocess_sim, ((0, {}),))
+    assert result == coarse
+    assert stats["size"] <= 16
+
+def test_task_seeds_follow_params_seed():
+    """Test that task seeds are reproducible from the parameters' seed."""
+    assert task_seeds({"seed": 5}, 4) == task_seeds({"seed": 5}, 4)
+    assert len(set(task_seeds({"seed": 5}, 100))) == 100
+    # Path seeds do not depend on how many paths are run
+    assert task_seeds({"seed": 5}, 100)[:4] == task_seeds({"seed": 5}, 4)
+
+def test_root_seeded_cells_share_paths(config_parameters, capsys):
+    """Test that the cells of an unseeded random run share one root seed and its market paths."""
+    params = dict(config_parameters, use_avg_growth=False, std_dev=0.15)
+    assert root_seeded(config_parameters) is config_parameters
+    assert root_seeded(dict(params, seed=3))["seed"] == 3
+    first, second = run_cells(params, [{}, {}])
+    assert first == second
+    # The printed root seed repeats the run
+    seed = int(capsys.readouterr().out.split("Root seed: ")[1].split()[0])
+    assert first == multiprocess_sim(dict(params, seed=seed))
+
+def test_run_sim_stop_conditions(config_parameters):
+    """Test that stop conditions end runs early with their status."""
+    params = config_parameters
+    full = multiprocess_sim(dict(params))
+    assert full[6] == "completed"
+    pruned = multiprocess_sim(dict(params, stop_min_cash=full[4] + 1))
+    assert pruned[6] == "pruned" and pruned[4] < full[4] + 1
+    assert multiprocess_sim(dict(params, stop_min_cash=full[4])) == full
+    retired = multiprocess_sim(dict(params, stop_at_retirement=True))
+    assert retired[6] == ("retired" if full[5] != -1 else "completed")
+    assert retired[5] == full[5]
+    negative = multiprocess_sim(dict(params, stop_negative=True, expenses={"rent": 10**6}))
+    assert negative[6] == "pruned"
+
+def test_run_2v_sims_masks_pruned_cells(config_parameters):
+    """Test that cells pruned by a stop condition are not reported as real outcomes."""
+    params = dict(config_parameters, stop_min_cash=10**7)
+    results = run_2v_sims(params, {"min": 0.1, "max": 0.5, "increment": 0.2, "name": "invest_factor"},
+                          {"values": [70000, 140000], "name": "income"})
+    cells = [(row, col) for row in range(3) for col in range(2)]
+    assert all(results["status"][row][col] == "pruned" for row, col in cells)
+    assert all(np.isnan(results["Net"][row][col]) and np.isnan(results["min_cash"][row][col])
+               for row, col in cells)
+
+@pytest.mark.parametrize("stat_sim", [run_stat_sim, run_stat_sim_retirement])
+def test_stat_sims_seed_batches(stat_sim, config_parameters, monkeypatch):
+    """Test that batch stat sims pass the configured seed on to the batch engine."""
+    seeds = []
+    def fake_batch(params, n_paths, seed=None):
+        seeds.append(seed)
+        return {name: np.zeros(n_paths) for name in ("net_assets", "cash", "retirement_year")}
+    monkeypatch.setattr(sim_engine, "run_batch_sim", fake_batch)
+    monkeypatch.setattr(visualization, "create_stat_graph", lambda *args: None)
+    stat_sim(dict(config_parameters, seed=11), 4, batch=True)
+    assert seeds == [11]
+
+def test_percentile_intervals():
+    """Test that interval half widths follow the spread of the round percentiles."""
+    assert np.array_equal(percentile_intervals([[1, 5], [1, 5]]), [0, 0])
+    # Two rounds have one degree of freedom, so the half width is 12.71 * (sd 1) / sqrt(2)
+    assert np.allclose(percentile_intervals([[0, 4], [np.sqrt(2), 4]]), [12.71 / np.sqrt(2), 0])
+
+@pytest.mark.parametrize("batch", [True, False])
+def test_stat_paths_converge(batch, config_parameters):
+    """Test that convergence runs add rounds until the percentiles settle or max_paths is hit."""
+    params = dict(config_parameters, std_dev=0.15, seed=5)
+    single = stat_paths(dict(params), 20, batch, False, None, 10**6, "net_assets")
+    assert single["paths"] == single["net_assets"].count == len(single["sample"]["cash"]) == 20
+    assert single["intervals"] is None
+    loose = stat_paths(dict(params), 20, batch, True, 10**12, 10**6, "net_assets")
+    assert loose["paths"] == 20 * 4 and (loose["intervals"] <= 10**12).all()
+    capped = stat_paths(dict(params), 21, batch, True, 0.01, 100, "net_assets")
+    # Odd round sizes grow by one to keep antithetic pairs together
+    assert capped["paths"] == capped["cash"].count == 110
+    with pytest.raises(ValueError):
+        stat_paths(dict(params, bootstrap=True), 20, batch, True, None, 10**6, "net_assets")
+
+def test_antithetic_pool_paths_pair_seeds(config_parameters):
+    """Test that the twin of a pool path reuses its seed with mirrored shocks."""
+    params = dict(config_parameters, std_dev=0.15, seed=5)
+    results = stat_paths(dict(params), 4, False, True, None, 10**6, "net_assets")
+    seed = task_seeds(params, 1)[0]
+    twin = multiprocess_sim(dict(params, use_avg_growth=False, seed=seed, antithetic=True))
+    assert results["sample"]["net_assets"][1] == twin[0]
+
+def test_stat_paths_stream_sketches(config_parameters):
+    """Test that stat sims summarize every path in sketches and keep only a bounded sample."""
+    params = dict(config_parameters, std_dev=0.15, seed=5)
+    results = stat_paths(dict(params), 60, False, False, None, 10**6, "net_assets", sample_paths=25)
+    seeds = task_seeds(root_seeded(dict(params, use_avg_growth=False)), 25)
+    assert len(results["sample"]["net_assets"]) == 25
+    assert results["sample"]["net_assets"][24] == multiprocess_sim(dict(params, use_avg_growth=False, seed=seeds[24]))[0]
+    full = stat_paths(dict(params), 60, False, False, None, 10**6, "net_assets")
+    assert results["net_assets"].count == 60
+    assert np.isclose(results["net_assets"].median(), np.median(full["sample"]["net_assets"]))
+    # Retirement years are counted exactly rather than interpolated
+    years = full["sample"]["retirement_year"]
+    assert np.array_equal(full["retirement_year"].percentile(PERCENTILES), np.percentile(years, PERCENTILES))
+
+def test_plot_path(tmp_path):
+    """Test that graphs are shown unless an output directory is configured."""
+    assert plot_path({}, "time") is None
+    path = plot_path({"plot_output": str(tmp_path / "plots"), "plot_format": "svg"}, "time")
+    assert path == str(tmp_path / "plots" / "time.svg") and (tmp_path / "plots").is_dir()
@@ -0,0 +1,49 @@
+import pytest
+from stock_sim.sweep import load_sweep, run_sweep, sweep_cells
+from stock_sim.sim_engine import apply_changes, axis_values, multiprocess_sim
+
+def test_sweep_cells_are_lazy():
+    """Test that cells are generated on demand with the last axis varying fastest."""
+    cells = sweep_cells([{"name": "income", "min": 1, "max": 10**4, "increment": 1},
+                         {"name": "invest_factor", "min": 0.01, "max": 1, "increment": 0.01},
+                         {"name": "expenses.groceries", "values": [100, 200]}])
+    # A million cells are never materialized
+    assert next(cells) == {"income": 1, "invest_factor": 0.01, "expenses.groceries": 100}
+    assert next(cells) == {"income": 1, "invest_factor": 0.01, "expenses.groceries": 200}
+    assert next(cells) == {"income": 1, "invest_factor": 0.02, "expenses.groceries": 100}
+
+def test_apply_changes_copies_nested_dicts(config_parameters):
+    """Test that dotted names set nested keys without touching the base parameters."""
+    resolved = apply_changes(config_parameters, {"expenses.groceries": 1, "invest_factor": 0.5})
+    assert resolved["expenses"]["groceries"] == 1 and resolved["invest_factor"] == 0.5
+    assert config_parameters["expenses"]["groceries"] != 1
+
+def test_run_sweep_round_trip(config_parameters, tmp_path):
+    """Test that every cell is stored once and matches a direct simulation."""
+    axes = [{"name": "invest_factor", "min": 0.1, "max": 0.5, "increment": 0.2},
+            {"name": "expenses.groceries", "values": [300, 900]},
+            {"name": "income", "values": [70000, 140000]}]
+    run_sweep(config_parameters, axes, str(tmp_path), block_size=5)
+    meta, columns = load_sweep(str(tmp_path))
+    assert meta["rows"] == meta["cells"] == 12
+    assert sorted(columns["cell"].tolist()) == list(range(12))
+    row = list(columns["cell"]).index(7)
+    changes = {axis["name"]: axis["values"][int(columns[f"{axis['name']}_index"][row])] for axis in meta["axes"]}
+    assert changes == {"invest_factor": 0.3, "expenses.groceries": 900, "income": 140000}
+    expected = multiprocess_sim(apply_changes(config_parameters, changes))
+    assert columns["net_assets"][row] == expected[0]
+    assert columns["retirement_year"][row] == expected[5]
+
+def test_run_sweep_records_root_seed(config_parameters, tmp_path):
+    """Test that a random sweep stores the root seed its cells shared."""
+    params = dict(config_parameters, use_avg_growth=False, std_dev=0.15)
+    meta = run_sweep(params, [{"name": "income", "values": [70000, 70000]}], str(tmp_path))
+    _, columns = load_sweep(str(tmp_path))
+    assert columns["net_assets"][0] == columns["net_assets"][1]
+    assert columns["net_assets"][0] == multiprocess_sim(dict(params, income=70000, seed=meta["seed"]))[0]
+
+def test_axis_values_small_float_steps():
+    """Test that steps written in scientific notation keep their decimals."""
+    assert axis_values({"name": "x", "min": 0.0, "max": 5e-5, "increment": 1e-5}) == \
+        [0.0, 1e-05, 2e-05, 3e-05, 4e-05, 5e-05]
+    assert axis_values({"name": "x", "min": 0.01, "max": 0.07, "increment": 0.02}) == [0.01, 0.03, 0.05, 0.07]
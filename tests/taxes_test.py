@@ -0,0 +1,56 @@
+import pytest
+import numpy as np
+from stock_sim.taxes import TaxSchedule, TaxCache, compile_tax_rates
+from stock_sim.finance import tax_rates
+
+@pytest.fixture
+def schedule():
+    """Fixture compiling the married flat tax table."""
+    return TaxSchedule(tax_rates["virginia_us_tax_rates_married_flat"])
+
+def test_brackets_sorted_by_threshold(schedule):
+    """Test that brackets compile to sorted thresholds with fractional rates."""
+    idx = schedule.tax_types.index("federal_income")
+    assert schedule.thresholds[idx] == sorted(schedule.thresholds[idx])
+    assert schedule.calculate_tax_bracket(100000)["federal_income"] == "22%"
+    assert schedule.calculate_tax_bracket(22000)["federal_income"] == "10%"
+
+def test_array_matches_scalar(schedule):
+    """Test that array lookups give the same taxes as scalar ones."""
+    incomes = np.array([5000.0, 22000.0, 89452.0, 150000.0, 700000.0])
+    dividends = np.array([0.0, 100.0, 2000.0, 30000.0, 1e6])
+    per_type, total = schedule.taxes_owed(incomes, dividends)
+    for n, (income, dividend) in enumerate(zip(incomes, dividends)):
+        scalar_per_type, scalar_total = schedule.taxes_owed(float(income), float(dividend))
+        assert total[n] == scalar_total
+        for tax_type, amount in scalar_per_type.items():
+            assert per_type[tax_type][n] == amount
+
+def test_social_security_cap(schedule):
+    """Test that social security stops growing past the wage base."""
+    per_type, _ = schedule.taxes_owed(500000.0)
+    assert per_type["federal_social-security"] == pytest.approx(147000 * 0.062)
+
+def test_dividend_rate(schedule):
+    """Test that the dividend rate follows the income bracket."""
+    assert schedule.dividend_rate(50000.0) == 0
+    assert schedule.dividend_rate(100000.0) == pytest.approx(0.15)
+
+def test_tax_cache_lru(schedule):
+    """Test that the cache rounds keys, evicts the least recently used entry and counts both."""
+    cache = TaxCache(capacity=2, resolution=1)
+    compute = lambda income, dividends: schedule.taxes_owed(income, dividends)
+    first = cache.lookup(schedule, 100000.2, 10.4, compute)
+    assert cache.lookup(schedule, 99999.8, 9.6, compute) is first
+    cache.lookup(schedule, 120000, 0, compute)
+    cache.lookup(schedule, 100000, 10, compute)
+    cache.lookup(schedule, 130000, 0, compute)
+    assert cache.stats() == {"hits": 2, "misses": 3, "evictions": 1, "size": 2}
+    assert (schedule.key, 120000, 0) not in cache.entries
+    assert first == schedule.taxes_owed(100000, 10)
+
+def test_tax_cache_shared_between_equal_tables():
+    """Test that equal tax tables compile to one schedule."""
+    table = tax_rates["virginia_us_tax_rates_single_flat"]
+    copy = {tax_type: dict(brackets) for tax_type, brackets in table.items()}
+    assert compile_tax_rates(table) is compile_tax_rates(copy)
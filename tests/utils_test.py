@@ -1,12 +1,47 @@
 import pytest
-from stock_sim.utils import pull_random_range, pick_random_date
+import numpy as np
+from stock_sim.utils import pull_random_range, pick_random_date, weekly_growth, bootstrap_growth
+from stock_sim.price_cache import weekly_returns, ticker_path
 
 def test_pick_random_date():
     """Test that a random date is picked correctly."""
     random_date = pick_random_date("^GSPC", 10)
     assert random_date.year >= 1927  # Ensure the date is within the expected range
+    # Every drawn start week leaves a full window, up to the very last one
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        start = pick_random_date("VOO", 10, rng)
+        assert weekly_growth("VOO", 10, start).shape == (520,)
 
 def test_pull_random_range():
     """Test pulling a random data range from a CSV."""
     result = pull_random_range("./stock_sim/database/AAPL.csv", 5)
     assert len(result) > 0  # Ensure data is returned
+
+def test_pull_range_is_sorted_view():
+    """Test that a fixed start date selects its window by binary search without copying."""
+    result = pull_random_range("./stock_sim/database/VOO.csv", 5, "2015-01-02")
+    assert isinstance(result, np.ndarray)
+    assert result.base is not None
+    assert 5 * 252 <= len(result) <= 5 * 400
+
+def test_weekly_growth_windows():
+    """Test that weekly growth windows span exactly 52 weeks per year for one or many paths."""
+    single = weekly_growth("^GSPC", 10, "1990-01-02")
+    assert single.shape == (520,)
+    batch = weekly_growth("^GSPC", 10, n_paths=8, rng=np.random.default_rng(0))
+    assert batch.shape == (520, 8)
+    with pytest.raises(ValueError):
+        weekly_growth("VOO", 40)
+
+def test_bootstrap_growth_blocks():
+    """Test that bootstrapped paths are stitched from whole historical blocks."""
+    rng = np.random.default_rng(0)
+    single = bootstrap_growth(["VOO"], 100, 10, rng)
+    assert single.shape == (100,)
+    paths = bootstrap_growth(["VOO", "VTI"], 2080, 26, rng, n_paths=64)
+    assert paths.shape == (2080, 64)
+    _, history = weekly_returns(ticker_path("VOO"))
+    block = single[:10]
+    start = np.flatnonzero(history == block[0])
+    assert any(np.array_equal(history[s:s + 10], block) for s in start)
@@ -1,2 +1,29 @@
 '''
-'''
\ No newline at end of file
+'''
+import time
+import numpy as np
+import pytest
+from stock_sim.visualization import create_2d_time_graph, create_3d_graph, create_stat_graph, density_counts
+
+@pytest.mark.parametrize("extension, magic", [("png", b"\x89PNG"), ("svg", b"<?xml")])
+def test_graphs_render_to_files(extension, magic, tmp_path):
+    """Test that every graph renders headlessly to a PNG or SVG file."""
+    outputs = [tmp_path / f"{name}.{extension}" for name in ("3d", "stat", "time")]
+    z = np.arange(12.0).reshape(4, 3) * 1000
+    create_3d_graph([1, 2, 3], [10, 20, 30, 40], z, "x", "y", "z", z, "z2", output=str(outputs[0]))
+    y = np.random.default_rng(0).normal(1e6, 1e5, 500)
+    create_stat_graph(range(500), y, "Net Assets ($)", output=str(outputs[1]))
+    weeks = np.arange(521)
+    create_2d_time_graph(weeks, weeks * 100.0, "Year", "Assets", weeks * 10.0, "Cash", output=str(outputs[2]))
+    for output in outputs:
+        assert output.read_bytes().startswith(magic)
+
+def test_large_scatters_become_densities(tmp_path):
+    """Test that big point clouds are binned, keeping the plotting time flat."""
+    y = np.random.default_rng(1).normal(1e6, 1e5, 400000)
+    x_edges, y_edges, counts = density_counts(np.arange(len(y)), y)
+    assert counts.shape == (len(y_edges) - 1, len(x_edges) - 1) and counts.sum() == len(y)
+    start = time.perf_counter()
+    create_stat_graph(np.arange(len(y)), y, "Net Assets ($)", output=str(tmp_path / "stat.png"))
+    assert time.perf_counter() - start < 10
+    assert (tmp_path / "stat.png").stat().st_size > 0